@@ -0,0 +1,127 @@
+import sys
+import os
+import json
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+# Built once per worker process by init_worker and reused for every session it runs
+_monitor = None
+
+
+def load_manifest(manifest_path: str) -> List[Dict]:
+    """Load session rows from a JSONL manifest.
+
+    Each line is an object with "video", "audio", "student_id" and "output" keys.
+    """
+    sessions = []
+    with open(manifest_path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            missing = [key for key in ("video", "audio", "student_id", "output") if key not in row]
+            if missing:
+                raise ValueError(f"Manifest line {line_number} is missing: {', '.join(missing)}")
+            sessions.append(row)
+    return sessions
+
+
+def init_worker(monitor_options: Dict):
+    """Process pool initializer: build this worker's ExamMonitor."""
+    global _monitor
+    from main import ExamMonitor
+    _monitor = ExamMonitor(output_path="", **monitor_options)
+
+
+def run_session(row: Dict) -> Dict:
+    """Analyze one manifest row on this worker's ExamMonitor; needs init_worker first."""
+    start = time.perf_counter()
+    report = _monitor.process_session(row["video"], row["audio"], str(row["student_id"]), row["output"])
+    return {
+        "student_id": row["student_id"],
+        "output": row["output"],
+        "ok": report is not None,
+        "seconds": time.perf_counter() - start,
+        "frames": report["metadata"].get("sampling", {}).get("frames_decoded", 0) if report else 0,
+        "report": report
+    }
+
+
+def run_batch(sessions: List[Dict], workers: Optional[int] = None,
+              monitor_options: Optional[Dict] = None) -> Dict:
+    """Run sessions across a pool of workers that each keep one warm ExamMonitor."""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sessions) or 1))
+    results = []
+    start = time.perf_counter()
+
+    # Spawn, not fork: MediaPipe graphs and OpenCV thread pools are not fork-safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_worker, initargs=(monitor_options or {},)) as executor:
+        futures = {executor.submit(run_session, row): row for row in sessions}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                result = future.result()
+                result.pop("report", None)
+            except Exception as e:
+                logging.error(f"Session for student {row['student_id']} crashed: {e}")
+                result = {"student_id": row["student_id"], "output": row["output"],
+                          "ok": False, "seconds": 0.0, "frames": 0}
+            results.append(result)
+            status = "OK" if result["ok"] else "FAILED"
+            print(f"[{len(results)}/{len(sessions)}] {result['student_id']}: {status} "
+                  f"({result['seconds']:.1f}s)")
+
+    wall_seconds = time.perf_counter() - start
+    completed = [r for r in results if r["ok"]]
+    total_frames = sum(r["frames"] for r in completed)
+    return {
+        "workers": workers,
+        "sessions": len(sessions),
+        "succeeded": len(completed),
+        "failed": len(results) - len(completed),
+        "wall_seconds": round(wall_seconds, 2),
+        "sessions_per_minute": round(len(completed) * 60 / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "mean_session_seconds": round(sum(r["seconds"] for r in completed) / len(completed), 2) if completed else 0.0,
+        "frames_per_second": round(total_frames / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "results": sorted(results, key=lambda r: str(r["student_id"]))
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python batch.py <manifest.jsonl> [workers] [target_fps]")
+        sys.exit(1)
+
+    manifest_path = sys.argv[1]
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    target_fps = float(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    try:
+        sessions = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest: {str(e)}")
+        sys.exit(1)
+    if not sessions:
+        print("No sessions found in manifest.")
+        sys.exit(1)
+
+    summary = run_batch(sessions, workers, {"target_fps": target_fps})
+
+    print(f"Processed {summary['sessions']} sessions with {summary['workers']} workers "
+          f"in {summary['wall_seconds']}s")
+    print(f"Succeeded: {summary['succeeded']}, Failed: {summary['failed']}")
+    print(f"Throughput: {summary['sessions_per_minute']} sessions/min, "
+          f"{summary['frames_per_second']} frames/s")
+    print(f"Mean session time: {summary['mean_session_seconds']}s")
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Throughput benchmark for the ai-ml pipeline stages on synthetic fixtures.
+
+Generates deterministic fixtures: a video with a moving face-like pattern
+interleaved with blank frames, and a tone-plus-noise recording. Then it
+measures each stage in a fresh interpreter, so that peak RSS belongs to
+that stage alone:
+
+    video           EnhancedActivityAnalyzer.process_video            frames/s
+    voice_features  audio_processor.SoundFeatureExtractor              audio-s/s
+                    .extract_voice_features
+    sound_features  sound_features.SoundFeatureExtractor               audio-s/s
+                    .extract_features
+    anomaly         EnhancedAnomalyDetector.analyze_session            sessions/s
+
+With --baseline, throughput and peak RSS are compared against a stored run,
+and the script exits non-zero when a stage is slower or larger by more than
+--tolerance, fails, or is in the baseline but was not measured. Stage outputs are compared too, so a change in results is
+reported even when the timings are fine. Baselines are machine-specific:
+write one with --save-baseline on the deploy hardware.
+
+Usage: python benchmarks/pipeline_benchmark.py [--seconds 60] [--baseline benchmarks/baseline.json]
+                                               [--save-baseline] [--tolerance 0.2] [--stages video,anomaly]
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+AI_ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_ML_DIR)
+
+STAGES = ["video", "voice_features", "sound_features", "anomaly"]
+VIDEO_FPS = 30
+VIDEO_SIZE = (640, 480)
+AUDIO_SR = 22050
+ANOMALY_SESSIONS = 500
+
+
+def make_video(path: str, seconds: float):
+    """A face-like pattern that drifts, nods and opens its mouth, with 2 s of blank frames every 10 s."""
+    import cv2
+    width, height = VIDEO_SIZE
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), VIDEO_FPS, (width, height))
+    for i in range(int(seconds * VIDEO_FPS)):
+        frame = np.full((height, width, 3), 40, np.uint8)
+        if (i // VIDEO_FPS) % 10 < 8:
+            cx = width // 2 + int(80 * np.sin(i / 20))
+            cy = height // 2 + int(20 * np.sin(i / 7))
+            cv2.ellipse(frame, (cx, cy), (100, 140), 0, 0, 360, (180, 200, 230), -1)
+            eye_height = 2 if i % 90 < 4 else 12
+            cv2.ellipse(frame, (cx - 40, cy - 40), (14, eye_height), 0, 0, 360, (0, 0, 0), -1)
+            cv2.ellipse(frame, (cx + 40, cy - 40), (14, eye_height), 0, 0, 360, (0, 0, 0), -1)
+            cv2.ellipse(frame, (cx, cy + 60), (40, 10 + i % 30), 0, 0, 360, (50, 50, 150), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def make_audio(path: str, seconds: float):
+    """A pitch-modulated tone in on/off bursts over background noise."""
+    import soundfile as sf
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * AUDIO_SR), dtype=np.float64) / AUDIO_SR
+    pitch = 180 + 40 * np.sin(2 * np.pi * 0.2 * t)
+    voice = 0.3 * np.sin(2 * np.pi * np.cumsum(pitch) / AUDIO_SR)
+    bursts = (np.sin(2 * np.pi * 0.5 * t) > 0).astype(np.float64)
+    noise = 0.02 * rng.standard_normal(len(t))
+    sf.write(path, (voice * bursts + noise).astype(np.float32), AUDIO_SR)
+
+
+def _flatten(value, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}{key}."))
+        return flat
+    return {prefix.rstrip("."): float(value)}
+
+
+def _warmup_audio(audio_path: str) -> str:
+    """A 1 s recording to run first, so numba compiles librosa's kernels outside the timing."""
+    path = os.path.join(os.path.dirname(audio_path), "warmup.wav")
+    make_audio(path, 1.0)
+    return path
+
+
+def run_stage(stage: str, video_path: str, audio_path: str, seconds: float) -> Dict:
+    """Run one stage in this process and return its timing, size and outputs."""
+    if stage == "video":
+        from models.activity_model.activity_detector import EnhancedActivityAnalyzer
+        analyzer = EnhancedActivityAnalyzer()
+        start = time.perf_counter()
+        report = analyzer.process_video(video_path)
+        elapsed = time.perf_counter() - start
+        units, unit = report["sampling"]["frames_decoded"], "frames/s"
+        results = _flatten(report["activity_metrics"])
+    elif stage == "voice_features":
+        from models.audio_model.audio_processor import SoundFeatureExtractor
+        extractor = SoundFeatureExtractor()
+        extractor.extract_voice_features(_warmup_audio(audio_path))
+        start = time.perf_counter()
+        features = extractor.extract_voice_features(audio_path)
+        elapsed = time.perf_counter() - start
+        units, unit = seconds, "audio-s/s"
+        results = _flatten(features)
+    elif stage == "sound_features":
+        import librosa
+        from models.audio_model.sound_features import SoundFeatureExtractor
+        extractor = SoundFeatureExtractor()
+        extractor.extract_features(librosa.load(_warmup_audio(audio_path), sr=extractor.sample_rate)[0])
+        start = time.perf_counter()
+        audio, _ = librosa.load(audio_path, sr=extractor.sample_rate)
+        features = extractor.extract_features(audio)
+        elapsed = time.perf_counter() - start
+        units, unit = seconds, "audio-s/s"
+        results = {"length": float(len(features)), "mean": float(np.mean(features)),
+                   "norm": float(np.linalg.norm(features))}
+    elif stage == "anomaly":
+        from models.anomlydetect_model.anomaly_detector import EnhancedAnomalyDetector
+        rng = np.random.default_rng(0)
+        features = np.column_stack([rng.uniform(0, 40, (ANOMALY_SESSIONS, 5)),
+                                    rng.uniform(0, 30, ANOMALY_SESSIONS),
+                                    rng.uniform(70, 100, ANOMALY_SESSIONS)])
+        detector = EnhancedAnomalyDetector()
+        detector.isolation_forest.set_params(random_state=0)
+        detector.fit(features)
+        names = detector.FEATURE_NAMES
+        start = time.perf_counter()
+        risk_total = 0.0
+        for row in features:
+            result = detector.analyze_session(dict(zip(names[:5], row[:5])), dict(zip(names[5:], row[5:])))
+            risk_total += result["risk_score"]
+        elapsed = time.perf_counter() - start
+        units, unit = ANOMALY_SESSIONS, "sessions/s"
+        results = {"risk_total": risk_total,
+                   "bulk_risk_total": float(detector.score_sessions(features)["risk_score"].sum())}
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    return {
+        "seconds": elapsed,
+        "throughput": units / elapsed if elapsed > 0 else 0.0,
+        "unit": unit,
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+                       (1024 * 1024 if sys.platform == "darwin" else 1024),
+        "results": results
+    }
+
+
+def measure(stage: str, video_path: str, audio_path: str, seconds: float) -> Dict:
+    """Run a stage in a fresh interpreter so imports and RSS do not leak between stages."""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-stage", stage,
+                             "--video", video_path, "--audio", audio_path, "--seconds", str(seconds)],
+                            cwd=AI_ML_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if "Error" in line]
+        raise RuntimeError(errors[-1] if errors else "failed")
+    try:
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        raise RuntimeError("no result printed") from None
+
+
+def compare(current: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            errors: Optional[Dict[str, str]] = None) -> List[str]:
+    """Regressions of current against baseline, as printable lines.
+
+    A stage that failed (in errors) or that is in the baseline but has no
+    current result is a regression too.
+    """
+    errors = errors or {}
+    regressions = [f"{stage}: failed: {error}" for stage, error in errors.items()]
+    regressions += [f"{stage}: in baseline but not measured"
+                    for stage in baseline if stage not in current and stage not in errors]
+    for stage, now in current.items():
+        before = baseline.get(stage)
+        if not before:
+            continue
+        if now["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{stage}: throughput {now['throughput']:.1f} {now['unit']} "
+                               f"vs baseline {before['throughput']:.1f}")
+        if now["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: peak RSS {now['peak_rss_mb']:.0f} MB "
+                               f"vs baseline {before['peak_rss_mb']:.0f} MB")
+        for key, value in before.get("results", {}).items():
+            if key not in now["results"]:
+                regressions.append(f"{stage}: result {key} missing, baseline {value:.6g}")
+            elif not np.isclose(now["results"][key], value, rtol=1e-3, atol=1e-6):
+                regressions.append(f"{stage}: result {key} = {now['results'][key]:.6g} "
+                                   f"vs baseline {value:.6g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ai-ml pipeline on synthetic fixtures")
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of the synthetic video and audio")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stages to run")
+    parser.add_argument("--baseline", default=os.path.join(AI_ML_DIR, "benchmarks", "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--video", help=argparse.SUPPRESS)
+    parser.add_argument("--audio", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage, args.video, args.audio, args.seconds)))
+        return
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    current = {}
+    errors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, "synthetic.mp4")
+        audio_path = os.path.join(tmp, "synthetic.wav")
+        make_video(video_path, args.seconds)
+        make_audio(audio_path, args.seconds)
+
+        print(f"Fixtures: {args.seconds:.0f}s video at {VIDEO_FPS} fps {VIDEO_SIZE[0]}x{VIDEO_SIZE[1]}, "
+              f"{args.seconds:.0f}s audio at {AUDIO_SR} Hz")
+        print(f"{'stage':<16} {'seconds':>8} {'throughput':>12} {'unit':<11} {'peak RSS (MB)':>13}")
+        for stage in stages:
+            try:
+                current[stage] = measure(stage, video_path, audio_path, args.seconds)
+            except RuntimeError as e:
+                errors[stage] = str(e)
+                print(f"{stage:<16} error: {e}")
+                continue
+            result = current[stage]
+            print(f"{stage:<16} {result['seconds']:>8.2f} {result['throughput']:>12.1f} "
+                  f"{result['unit']:<11} {result['peak_rss_mb']:>13.0f}")
+
+    run = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count()},
+        "seconds": args.seconds,
+        "stages": current
+    }
+    if args.save_baseline:
+        if errors:
+            print(f"Not saving a baseline: {', '.join(errors)} failed.")
+            sys.exit(1)
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        if errors:
+            sys.exit(1)
+        return
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline.get("seconds") != args.seconds:
+        print(f"Baseline was recorded with --seconds {baseline.get('seconds')}; throughput may not be comparable.")
+    regressions = compare(current, baseline["stages"], args.tolerance, errors)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions against baseline (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare per-metric STFTs with the shared SpectralContext in extract_voice_features.
+
+Generates a deterministic speech-like signal (a pitch-modulated tone with
+bursts and background noise), then times the five spectral voice metrics two
+ways: the original path, where each librosa call recomputes the STFT from the
+waveform, and the shared path, which computes one SpectralContext. It also
+checks that both paths return the same values.
+
+Usage: python benchmarks/spectral_benchmark.py [seconds] [sample_rate]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import librosa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.audio_model.audio_processor import SoundFeatureExtractor, SpectralContext
+
+
+def synthetic_audio(seconds: float, sr: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr), dtype=np.float32) / sr
+    pitch = 180 + 40 * np.sin(2 * np.pi * 0.2 * t)
+    voice = 0.3 * np.sin(2 * np.pi * np.cumsum(pitch) / sr)
+    bursts = (np.sin(2 * np.pi * 0.5 * t) > 0).astype(np.float32)
+    noise = 0.02 * rng.standard_normal(len(t)).astype(np.float32)
+    return (voice * bursts + noise).astype(np.float32)
+
+
+def per_metric_stfts(audio: np.ndarray) -> dict:
+    """The metric computations as they were before SpectralContext."""
+    pitches, magnitudes = librosa.piptrack(y=audio)
+    return {
+        "strength": np.mean(librosa.feature.melspectrogram(y=audio, sr=22050)),
+        "background_level": np.mean(np.percentile(np.abs(librosa.stft(audio)), 10, axis=1)),
+        "disturbance_level": np.mean(librosa.onset.onset_strength(y=audio)),
+        "clarity": np.mean(librosa.feature.spectral_contrast(y=audio)),
+        "pitch_stability": np.std(pitches[magnitudes > np.median(magnitudes)])
+    }
+
+
+def shared_stft(audio: np.ndarray) -> dict:
+    extractor = SoundFeatureExtractor()
+    spec = SpectralContext(audio)
+    return {
+        "strength": extractor._calculate_voice_strength(spec),
+        "background_level": extractor._calculate_background_noise(spec),
+        "disturbance_level": extractor._calculate_disturbance(spec),
+        "clarity": extractor._calculate_voice_clarity(spec),
+        "pitch_stability": extractor._calculate_pitch_stability(spec)
+    }
+
+
+def timed(fn, audio):
+    start = time.perf_counter()
+    result = fn(audio)
+    return result, time.perf_counter() - start
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3600.0
+    sr = int(sys.argv[2]) if len(sys.argv) > 2 else 22050
+
+    audio = synthetic_audio(seconds, sr)
+    # Warm up numba-compiled librosa kernels so the first timing is not penalised
+    shared_stft(audio[:sr])
+    per_metric_stfts(audio[:sr])
+
+    baseline, baseline_seconds = timed(per_metric_stfts, audio)
+    shared, shared_seconds = timed(shared_stft, audio)
+
+    print(f"Audio: {seconds:.0f}s at {sr} Hz")
+    print(f"Per-metric STFTs: {baseline_seconds:.2f}s")
+    print(f"Shared STFT:      {shared_seconds:.2f}s")
+    print(f"Speedup:          {baseline_seconds / shared_seconds:.2f}x")
+    for name in baseline:
+        close = np.isclose(baseline[name], shared[name], rtol=1e-5)
+        print(f"  {name:<18} {float(baseline[name]):>14.6f} {float(shared[name]):>14.6f} "
+              f"{'ok' if close else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Cold-start benchmark for the ai-ml entry points.
+
+Every measurement runs in a fresh interpreter so that nothing is already
+imported or cached. Reports the import time of each heavy dependency and
+model module, the time main.py takes to reject a missing input file, and the
+time to construct an ExamMonitor.
+
+Usage: python benchmarks/startup_benchmark.py [repeats] [fail_fast_budget_seconds]
+"""
+import os
+import sys
+import subprocess
+import tempfile
+import time
+from statistics import median
+from typing import List
+
+AI_ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "numpy",
+    "cv2",
+    "mediapipe",
+    "librosa",
+    "soundfile",
+    "sklearn.ensemble",
+    "models.activity_model.activity_detector",
+    "models.audio_model.audio_processor",
+    "models.anomlydetect_model.anomaly_detector",
+    "main",
+]
+
+
+def _run_python(code: str) -> float:
+    """Run code in a fresh interpreter and return the seconds it printed."""
+    result = subprocess.run([sys.executable, "-c", code], cwd=AI_ML_DIR,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if "Error" in line]
+        raise RuntimeError(errors[-1] if errors else "failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def import_time(module: str, repeats: int) -> float:
+    code = (f"import time; start = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - start)")
+    return median(_run_python(code) for _ in range(repeats))
+
+
+def fail_fast_time(repeats: int) -> float:
+    """Wall time for `python main.py` to exit on a missing video file."""
+    samples: List[float] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        args = [sys.executable, "main.py", os.path.join(tmp, "missing.mp4"),
+                os.path.join(tmp, "missing.wav"), "0", os.path.join(tmp, "report.json")]
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(args, cwd=AI_ML_DIR, capture_output=True)
+            samples.append(time.perf_counter() - start)
+    return median(samples)
+
+
+def monitor_construction_time() -> float:
+    code = ("import time; start = time.perf_counter(); from main import ExamMonitor; "
+            "ExamMonitor('report.json'); print(time.perf_counter() - start)")
+    return _run_python(code)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+
+    print(f"{'module':<45} {'import (s)':>10}")
+    for module in MODULES:
+        try:
+            print(f"{module:<45} {import_time(module, repeats):>10.3f}")
+        except RuntimeError as e:
+            print(f"{module:<45} {'error':>10}  {e}")
+
+    try:
+        print(f"\nExamMonitor construction: {monitor_construction_time():.3f}s")
+    except RuntimeError as e:
+        print(f"\nExamMonitor construction: error ({e})")
+
+    fail_fast = fail_fast_time(repeats)
+    print(f"main.py fail-fast on missing input: {fail_fast:.3f}s (budget {budget:.3f}s)")
+    if fail_fast > budget:
+        print("Fail-fast path is over budget.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
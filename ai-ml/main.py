@@ -1,19 +1,52 @@
 import sys
 import os
 import json
+import time
 import logging
-from typing import Dict, Optional
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
 from datetime import datetime
-from models.activity_model.activity_detector import EnhancedActivityAnalyzer
-from models.audio_model.audio_processor import VoiceProcessor
-from models.anomlydetect_model.anomaly_detector import EnhancedAnomalyDetector
 
 
 class ExamMonitor:
-    def __init__(self, output_path: str):
-        self.activity_analyzer = EnhancedActivityAnalyzer()
-        self.audio_detector = VoiceProcessor()
-        self.anomaly_detector = EnhancedAnomalyDetector()
+    def __init__(self, output_path: str, target_fps: Optional[float] = None, queue_depth: int = 8,
+                 num_shards: int = 1, anomaly_model_path: Optional[str] = None,
+                 window_seconds: float = 60.0, window_hop_seconds: Optional[float] = None,
+                 instrument: bool = True, metrics_textfile: Optional[str] = None,
+                 concurrent: bool = True, single_demux: bool = True,
+                 inference_width: Optional[int] = None, metrics_chunk: int = 1,
+                 motion_threshold: Optional[float] = None, max_gated_frames: int = 30):
+        # Model modules pull in cv2, mediapipe, librosa and sklearn; import them only
+        # once a monitor is actually needed so argument errors are reported fast.
+        from models.activity_model.activity_detector import EnhancedActivityAnalyzer
+        from models.audio_model.audio_processor import VoiceProcessor
+        from models.anomlydetect_model.anomaly_detector import EnhancedAnomalyDetector
+        from models.instrumentation import StageTimer
+
+        # Per-session stage timings go into the report; totals feed the optional
+        # Prometheus textfile ("{pid}" in the path gives each process its own file)
+        self.timer = StageTimer(enabled=instrument)
+        self.timer_totals = StageTimer(enabled=instrument)
+        self.metrics_textfile = metrics_textfile
+        self.activity_analyzer = EnhancedActivityAnalyzer(target_fps=target_fps, queue_depth=queue_depth,
+                                                          timer=self.timer, inference_width=inference_width,
+                                                          metrics_chunk=metrics_chunk,
+                                                          motion_threshold=motion_threshold,
+                                                          max_gated_frames=max_gated_frames)
+        self.num_shards = num_shards
+        # Run the audio branch on a worker thread while the video branch runs
+        self.concurrent = concurrent
+        # When video and audio come from the same recording, decode it once for both branches
+        self.single_demux = single_demux
+        self.window_seconds = window_seconds
+        self.window_hop_seconds = window_hop_seconds
+        self.audio_detector = VoiceProcessor(timer=self.timer)
+        if anomaly_model_path:
+            self.anomaly_detector = EnhancedAnomalyDetector.load(anomaly_model_path)
+        else:
+            # Without a trained model only the rule-based checks contribute to the report
+            self.anomaly_detector = EnhancedAnomalyDetector()
         self.output_path = output_path
         self._setup_logging()
 
@@ -24,41 +57,43 @@ class ExamMonitor:
         )
         logging.info("ExamMonitor initialized.")
 
-    def validate_paths(self, video_path: str, audio_path: str, output_path: str):
+    @staticmethod
+    def validate_paths(video_path: str, audio_path: str, output_path: str):
         """Validate file and directory paths."""
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"Audio file not found: {audio_path}")
         output_dir = os.path.dirname(output_path)
-        if not os.path.exists(output_dir):
+        if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
             logging.info(f"Output directory created: {output_dir}")
 
-    def process_session(self, video_path: str, audio_path: str, student_id: str) -> Optional[Dict]:
+    def process_session(self, video_path: str, audio_path: str, student_id: str,
+                        output_path: Optional[str] = None) -> Optional[Dict]:
         """Process a single exam session and generate a report."""
+        output_path = output_path or self.output_path
         try:
-            self.validate_paths(video_path, audio_path, self.output_path)
+            self.validate_paths(video_path, audio_path, output_path)
             
             logging.info(f"Processing session for student: {student_id}")
+            # The monitor may be reused across sessions; start from a clean history
+            self.activity_analyzer.reset()
+            self.timer.reset()
             
-            # Analyze video activity
-            logging.info("Analyzing video activity...")
-            activity_data = self.activity_analyzer.process_video(video_path)
-            
-            # Analyze audio data
-            logging.info("Analyzing audio...")
-            audio_data = self.audio_detector.process_student(student_id, {
-                "validate_audio_path": audio_path,
-                "operations": ["validate"]
-            })
+            activity_data, audio_data, branches = self._run_branches(video_path, audio_path, student_id)
 
             # Anomaly detection
             logging.info("Performing anomaly detection...")
-            anomaly_data = self.anomaly_detector.analyze_session(
-                activity_data["activity_metrics"],
-                audio_data.get("validation", {}).get("features", {})
-            )
+            with self.timer.stage("session.anomaly"):
+                audio_features = self.anomaly_detector.audio_summary(audio_data)
+                anomaly_data = self.anomaly_detector.analyze_session(
+                    activity_data["activity_metrics"],
+                    audio_features
+                )
+                flagged_windows = self.anomaly_detector.analyze_windows(
+                    self.activity_analyzer.window_metrics(self.window_seconds, self.window_hop_seconds)
+                )
 
             # Combine results into a report
             report = {
@@ -68,38 +103,173 @@ class ExamMonitor:
                     "files": {
                         "video": video_path,
                         "audio": audio_path
-                    }
+                    },
+                    "sampling": activity_data.get("sampling", {}),
+                    "pipeline": activity_data.get("pipeline", {}),
+                    "sharding": activity_data.get("sharding", {}),
+                    "motion_gate": activity_data.get("motion_gate", {}),
+                    "branches": branches
                 },
                 "analysis": {
                     "activity_metrics": activity_data.get("activity_metrics", {}),
                     "audio_analysis": {
                         "voice_metrics": audio_data.get("validation", {}).get("features", {}).get("voice_metrics", {}),
-                        "noise_metrics": audio_data.get("validation", {}).get("features", {}).get("noise_metrics", {})
+                        "noise_metrics": audio_data.get("validation", {}).get("features", {}).get("noise_metrics", {}),
+                        "audio_features": audio_features
                     },
                     "anomaly_detection": {
+                        "anomaly_score": anomaly_data.get("anomaly_score"),
                         "risk_score": anomaly_data.get("risk_score", 0),
                         "suspicious_activities": anomaly_data.get("suspicious_activities", []),
-                        "assessment": anomaly_data.get("overall_assessment", "Unknown")
+                        "assessment": anomaly_data.get("overall_assessment", "Unknown"),
+                        "flagged_windows": flagged_windows
                     }
                 },
                 "timestamps": activity_data.get("timestamps", [])
             }
 
+            if self.timer.enabled:
+                # Taken before the report is written, so the write itself only
+                # shows up in the Prometheus totals
+                report["metadata"]["timings"] = self.timer.summary()
+
             # Save the report
-            with open(self.output_path, 'w') as f:
-                json.dump(report, f, indent=4)
-            logging.info(f"Report saved to: {self.output_path}")
+            with self.timer.stage("session.report_write"):
+                with open(output_path, 'w') as f:
+                    json.dump(report, f, indent=4)
+            logging.info(f"Report saved to: {output_path}")
+            self._export_timings()
             
             return report
 
         except Exception as e:
             logging.error(f"Error processing session: {e}")
+            self._export_timings()
             return None
 
+    def _open_media(self, video_path: str, audio_path: str):
+        """A MediaDemuxer for the recording when both branches can share one decode, else None.
+
+        Needs both paths to name the same file, concurrent branches (the
+        streams are interleaved, so one branch cannot run ahead of the
+        other) and an unsharded video branch.
+        """
+        from models.media_ingest import MediaDemuxer
+        from models.audio_model.audio_processor import SpectralContext
+
+        if not (self.single_demux and self.concurrent and self.num_shards <= 1):
+            return None
+        if not os.path.samefile(video_path, audio_path) or not MediaDemuxer.supported():
+            return None
+        try:
+            return MediaDemuxer(video_path, sample_rate=SpectralContext.ANALYSIS_SR)
+        except (RuntimeError, ValueError) as e:
+            logging.warning(f"Single demux unavailable, decoding video and audio separately: {e}")
+            return None
+
+    def _analyze_video(self, video_path: str, cancelled: threading.Event, media=None) -> Dict:
+        logging.info("Analyzing video activity...")
+        if media is not None:
+            return self.activity_analyzer.process_frames(media.frames(), media.fps,
+                                                         media.info["frame_count"], cancelled)
+        if self.num_shards > 1:
+            return self.activity_analyzer.process_video_sharded(video_path, self.num_shards, cancelled)
+        return self.activity_analyzer.process_video(video_path, cancelled)
+
+    def _analyze_audio(self, audio_path: str, student_id: str, cancelled: threading.Event, media=None) -> Dict:
+        logging.info("Analyzing audio...")
+        try:
+            return self.audio_detector.process_student(student_id, {
+                "validate_audio_path": audio_path,
+                "operations": ["validate"]
+            }, cancelled, media.audio_chunks() if media is not None else None)
+        finally:
+            # Commit this session's result now rather than with a later batch
+            self.audio_detector.flush()
+
+    def _run_branches(self, video_path: str, audio_path: str, student_id: str) -> Tuple[Dict, Dict, Dict]:
+        """Run the video and audio branches, concurrently unless disabled.
+
+        The branches share no state until anomaly detection. If one fails,
+        the other is cancelled at its next frame or chunk, and the original
+        error is raised rather than the cancellation. Returns both results
+        and the per-branch wall times.
+
+        If _open_media allows it, both branches read from one ffmpeg decode
+        of the recording, and their positions on its media clock are reported.
+        """
+        cancelled = threading.Event()
+        seconds = {}
+        start = time.perf_counter()
+        media = self._open_media(video_path, audio_path)
+
+        def run(branch: str, analyze: Callable[[], Dict]) -> Dict:
+            start = time.perf_counter()
+            try:
+                with self.timer.stage(f"session.{branch}"):
+                    return analyze()
+            except BaseException:
+                cancelled.set()
+                if media is not None:
+                    # Unblocks the other branch if it is waiting on the shared decode
+                    media.close()
+                raise
+            finally:
+                seconds[branch] = time.perf_counter() - start
+
+        analyze_video = lambda: self._analyze_video(video_path, cancelled, media)
+        analyze_audio = lambda: self._analyze_audio(audio_path, student_id, cancelled, media)
+        try:
+            if self.concurrent:
+                # MediaPipe, OpenCV and the FFTs release the GIL, so a thread is enough
+                with ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-branch") as executor:
+                    audio_future = executor.submit(run, "audio", analyze_audio)
+                    try:
+                        activity_data = run("video", analyze_video)
+                    except CancelledError:
+                        # Cancelled because the audio branch failed; surface its error
+                        audio_future.result()
+                        raise
+                    audio_data = audio_future.result()
+            else:
+                activity_data = run("video", analyze_video)
+                audio_data = run("audio", analyze_audio)
+        finally:
+            if media is not None:
+                media.close()
+
+        branches = {
+            "concurrent": self.concurrent,
+            "video_seconds": round(seconds["video"], 3),
+            "audio_seconds": round(seconds["audio"], 3),
+            "wall_seconds": round(time.perf_counter() - start, 3),
+            "bounded_by": "video" if seconds["video"] >= seconds["audio"] else "audio",
+            "single_demux": media is not None
+        }
+        if media is not None:
+            branches["media_clock_ms"] = {
+                "video": int(round(media.frames_read * 1000 / media.fps)),
+                "audio": media.audio_clock_ms
+            }
+        logging.info(f"Branches finished: video {branches['video_seconds']}s, audio {branches['audio_seconds']}s, "
+                     f"wall {branches['wall_seconds']}s")
+        return activity_data, audio_data, branches
+
+    def _export_timings(self):
+        if not self.timer.enabled:
+            return
+        self.timer_totals.merge(self.timer.summary())
+        self.timer.reset()
+        if self.metrics_textfile:
+            try:
+                self.timer_totals.write_prometheus(self.metrics_textfile.format(pid=os.getpid()))
+            except OSError as e:
+                logging.warning(f"Could not write metrics textfile: {e}")
+
 
 def main():
     if len(sys.argv) < 5:
-        print(f"Usage: python main.py <video_path> <audio_path> <student_id> <output_path>")
+        print("Usage: python main.py <video_path> <audio_path> <student_id> <output_path> [target_fps]")
         print(f"Provided arguments: {sys.argv}")
         sys.exit(1)
     
@@ -107,13 +277,22 @@ def main():
     audio_path = sys.argv[2]
     student_id = sys.argv[3]
     output_path = sys.argv[4]
+    target_fps = float(sys.argv[5]) if len(sys.argv) > 5 else None
     print(f"Video Path: {video_path}")
     print(f"Audio Path: {audio_path}")
     print(f"Student ID: {student_id}")
     print(f"Output Path: {output_path}")
+    if target_fps:
+        print(f"Target FPS: {target_fps}")
+    
+    try:
+        ExamMonitor.validate_paths(video_path, audio_path, output_path)
+    except FileNotFoundError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
     
     try:
-        monitor = ExamMonitor(output_path)
+        monitor = ExamMonitor(output_path, target_fps=target_fps)
         report = monitor.process_session(video_path, audio_path, student_id)
         if report:
             print(f"Analysis complete. Report saved to: {output_path}")
@@ -1,10 +1,20 @@
 import cv2
 import numpy as np
 import mediapipe as mp
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
-from datetime import datetime
+from typing import Dict, Iterable, List, Tuple, Optional
+from dataclasses import dataclass, replace
+from concurrent.futures import CancelledError, ProcessPoolExecutor
 import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from models.instrumentation import StageTimer
+
+SHARD_WARMUP_FRAMES = 15
+# Percentage points a sharded report's activity_metrics may differ from a sequential run's
+SHARD_TOLERANCE = 5.0
 
 @dataclass
 class FaceMetrics:
@@ -12,10 +22,179 @@ class FaceMetrics:
     eye_aspect_ratio: float
     mouth_aspect_ratio: float
     head_pose: Tuple[float, float, float]  # pitch, yaw, roll
-    face_landmarks: Optional[List[Tuple[float, float, float]]] = None
+    face_landmarks: Optional[np.ndarray] = None  # (468, 3) float32, x and y in pixels
+
+def _landmark_array(face_landmarks) -> np.ndarray:
+    """Normalized (x, y, z) of a NormalizedLandmarkList as an (n, 3) float32 array."""
+    return np.array([(landmark.x, landmark.y, landmark.z) for landmark in face_landmarks.landmark],
+                    dtype=np.float32)
+
+class ActivityTimeline:
+    """Per-frame movement scores in preallocated typed arrays.
+
+    Each analyzed frame costs 32 bytes: four float32 scores plus the int64
+    frame index and presentation time in ms. Storage grows by doubling, so a
+    session needs at most twice the memory of its final length.
+    """
+    COLUMNS = ("face_movements", "eye_movements", "mouth_movements", "head_movements")
+
+    def __init__(self, capacity: int = 4096):
+        self._length = 0
+        self._scores = np.zeros((capacity, len(self.COLUMNS)), dtype=np.float32)
+        self._frame_index = np.zeros(capacity, dtype=np.int64)
+        self._pts_ms = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """Read-only view of one column, e.g. timeline["head_movements"]."""
+        if column == "frame_index":
+            view = self._frame_index[:self._length]
+        elif column == "pts_ms":
+            view = self._pts_ms[:self._length]
+        else:
+            view = self._scores[:self._length, self.COLUMNS.index(column)]
+        view = view.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def scores(self) -> np.ndarray:
+        return self._scores[:self._length]
+
+    @property
+    def nbytes(self) -> int:
+        return self._scores.nbytes + self._frame_index.nbytes + self._pts_ms.nbytes
+
+    def reserve(self, capacity: int):
+        if capacity <= len(self._frame_index):
+            return
+        scores = np.zeros((capacity, len(self.COLUMNS)), dtype=np.float32)
+        frame_index = np.zeros(capacity, dtype=np.int64)
+        pts_ms = np.zeros(capacity, dtype=np.int64)
+        scores[:self._length] = self._scores[:self._length]
+        frame_index[:self._length] = self._frame_index[:self._length]
+        pts_ms[:self._length] = self._pts_ms[:self._length]
+        self._scores, self._frame_index, self._pts_ms = scores, frame_index, pts_ms
+
+    def append(self, frame_index: int, pts_ms: int, frame_results: Dict[str, float]):
+        if self._length == len(self._frame_index):
+            self.reserve(max(2 * self._length, 1024))
+        row = self._length
+        self._scores[row] = (frame_results["face_movement"], frame_results["eye_movement"],
+                             frame_results["mouth_movement"], frame_results["head_movement"])
+        self._frame_index[row] = frame_index
+        self._pts_ms[row] = pts_ms
+        self._length += 1
+
+    def set_scores(self, row: int, frame_results: Dict[str, float]):
+        self._scores[row] = (frame_results["face_movement"], frame_results["eye_movement"],
+                             frame_results["mouth_movement"], frame_results["head_movement"])
+
+    def set_rows(self, rows: np.ndarray, scores: np.ndarray):
+        """Overwrite the scores of many rows at once; scores is (len(rows), 4) in COLUMNS order."""
+        self._scores[rows] = scores
+
+    def extend(self, other: "ActivityTimeline"):
+        self.reserve(self._length + len(other))
+        end = self._length + len(other)
+        self._scores[self._length:end] = other._scores[:len(other)]
+        self._frame_index[self._length:end] = other._frame_index[:len(other)]
+        self._pts_ms[self._length:end] = other._pts_ms[:len(other)]
+        self._length = end
+
+    def clear(self):
+        self._length = 0
+
+    def windows(self, window_ms: int, hop_ms: Optional[int] = None, burst_threshold: float = 0.5) -> Dict[str, np.ndarray]:
+        """Rolling statistics of every score column over time windows.
+
+        Windows are window_ms long and start every hop_ms (default: no
+        overlap) from the first frame's pts. window_ms must be a multiple of
+        hop_ms. Everything is O(n) in the number of frames:
+        - means come from differences of one cumulative sum;
+        - maxima come from per-hop maxima combined with a sliding view;
+        - bursts count score runs above burst_threshold that start in the
+          window.
+
+        Returns start_ms, end_ms, and start_row/stop_row (row bounds for
+        further cumulative sums). It also returns frames, plus mean, max and
+        bursts arrays of shape (windows, len(COLUMNS)). Windows with no
+        frames have zero statistics.
+        """
+        hop_ms = hop_ms or window_ms
+        if window_ms <= 0 or hop_ms <= 0 or window_ms % hop_ms:
+            raise ValueError("window_ms must be a positive multiple of hop_ms")
+        columns = len(self.COLUMNS)
+        if self._length == 0:
+            empty = np.zeros((0, columns), dtype=np.float64)
+            return {"start_ms": np.zeros(0, dtype=np.int64), "end_ms": np.zeros(0, dtype=np.int64),
+                    "start_row": np.zeros(0, dtype=np.int64), "stop_row": np.zeros(0, dtype=np.int64),
+                    "frames": np.zeros(0, dtype=np.int64), "mean": empty, "max": empty,
+                    "bursts": np.zeros((0, columns), dtype=np.int64)}
+
+        scores = self.scores
+        pts_ms = self._pts_ms[:self._length]
+        hops_per_window = window_ms // hop_ms
+        num_windows = int((pts_ms[-1] - pts_ms[0]) // hop_ms) + 1
+        # Hop boundaries; window w spans hops w .. w + hops_per_window - 1
+        hop_starts = pts_ms[0] + hop_ms * np.arange(num_windows + hops_per_window, dtype=np.int64)
+        hop_rows = np.searchsorted(pts_ms, hop_starts, side="left")
+        start_row = hop_rows[:num_windows]
+        stop_row = hop_rows[hops_per_window:hops_per_window + num_windows]
+        frames = stop_row - start_row
+        filled = frames > 0
+
+        cumulative = np.zeros((self._length + 1, columns), dtype=np.float64)
+        np.cumsum(scores, axis=0, out=cumulative[1:])
+        mean = np.zeros((num_windows, columns), dtype=np.float64)
+        np.divide(cumulative[stop_row] - cumulative[start_row], frames[:, None], out=mean, where=filled[:, None])
+
+        hop_frames = np.diff(hop_rows)
+        hop_max = np.zeros((len(hop_frames), columns), dtype=np.float32)
+        nonempty = hop_frames > 0
+        if nonempty.any():
+            hop_max[nonempty] = np.maximum.reduceat(scores, hop_rows[:-1][nonempty], axis=0)
+        window_max = np.lib.stride_tricks.sliding_window_view(hop_max, hops_per_window, axis=0).max(axis=-1)
+        window_max = window_max[:num_windows].astype(np.float64)
+
+        active = scores > burst_threshold
+        onsets = active.copy()
+        onsets[1:] &= ~active[:-1]
+        onset_counts = np.zeros((self._length + 1, columns), dtype=np.int64)
+        np.cumsum(onsets, axis=0, out=onset_counts[1:])
+        bursts = onset_counts[stop_row] - onset_counts[start_row]
+
+        return {
+            "start_ms": hop_starts[:num_windows],
+            "end_ms": hop_starts[:num_windows] + window_ms,
+            "start_row": start_row,
+            "stop_row": stop_row,
+            "frames": frames,
+            "mean": mean,
+            "max": window_max,
+            "bursts": bursts
+        }
+
+    def __getstate__(self) -> Dict:
+        # Only ship the filled rows between processes
+        return {
+            "_length": self._length,
+            "_scores": self.scores.copy(),
+            "_frame_index": self._frame_index[:self._length].copy(),
+            "_pts_ms": self._pts_ms[:self._length].copy()
+        }
 
 class EnhancedFaceDetector:
-    def __init__(self):
+    def __init__(self, timer: Optional[StageTimer] = None, inference_width: Optional[int] = None):
+        self.timer = timer or StageTimer(enabled=False)
+        # Frames wider than inference_width are downscaled before FaceMesh. Its
+        # landmarks are normalized, so they still map onto the original frame.
+        self.inference_width = inference_width
+        # Resize and colour conversion write into these, reallocated only when the frame size changes
+        self._resized: Optional[np.ndarray] = None
+        self._rgb: Optional[np.ndarray] = None
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
             max_num_faces=1,
@@ -27,102 +206,263 @@ class EnhancedFaceDetector:
         self.LEFT_EYE = [362, 385, 387, 263, 373, 380]
         self.RIGHT_EYE = [33, 160, 158, 133, 153, 144]
         self.MOUTH = [61, 291, 39, 181, 0, 17]
-        
-    def calculate_ear(self, eye_points: List[Tuple[float, float, float]]) -> float:
-        """Calculate eye aspect ratio"""
-        if not eye_points or len(eye_points) != 6:
+        # Points read by face_metrics_batch: the ends of the distances that make up
+        # EAR (left v1, v2, h, right v1, v2, h) and MAR (v, h), then the nose tip
+        # and the eye corners used for head pose
+        pairs = [(self.LEFT_EYE[1], self.LEFT_EYE[5]), (self.LEFT_EYE[2], self.LEFT_EYE[4]),
+                 (self.LEFT_EYE[0], self.LEFT_EYE[3]),
+                 (self.RIGHT_EYE[1], self.RIGHT_EYE[5]), (self.RIGHT_EYE[2], self.RIGHT_EYE[4]),
+                 (self.RIGHT_EYE[0], self.RIGHT_EYE[3]),
+                 (self.MOUTH[1], self.MOUTH[4]), (self.MOUTH[0], self.MOUTH[3])]
+        self._metric_points = np.array([a for a, _ in pairs] + [b for _, b in pairs] + [1, 33, 263])
+        # Distances -> numerators and denominators of left EAR, right EAR and MAR
+        self._ratio_numerators = np.zeros((8, 3))
+        self._ratio_numerators[[0, 1, 3, 4, 6], [0, 0, 1, 1, 2]] = 1.0
+        self._ratio_denominators = np.zeros((8, 3))
+        self._ratio_denominators[[2, 5, 7], [0, 1, 2]] = [2.0, 2.0, 1.0]
+        # Flattened (nose, left eye, right eye) x (x, y, z) -> arctan2 arguments of pitch, yaw, roll
+        self._pose_numerators = np.zeros((9, 3))
+        self._pose_numerators[[1, 4, 7], 0] = [1.0, -0.5, -0.5]
+        self._pose_numerators[[0, 3, 6], 1] = [1.0, -0.5, -0.5]
+        self._pose_numerators[[7, 4], 2] = [1.0, -1.0]
+        self._pose_denominators = np.zeros((9, 3))
+        self._pose_denominators[2, [0, 1]] = 1.0
+        self._pose_denominators[[6, 3], 2] = [1.0, -1.0]
+
+    def reset(self):
+        """Drop FaceMesh tracking state before starting an unrelated video."""
+        self.face_mesh.reset()
+
+    def calculate_ear(self, eye_points) -> float:
+        """Calculate eye aspect ratio from the six LEFT_EYE/RIGHT_EYE points"""
+        points = np.asarray(eye_points, dtype=np.float64)
+        if points.shape != (6, 3):
             return 0.0
-            
-        # Vertical distances
-        v1 = np.linalg.norm(np.array(eye_points[1]) - np.array(eye_points[5]))
-        v2 = np.linalg.norm(np.array(eye_points[2]) - np.array(eye_points[4]))
-        
-        # Horizontal distance
-        h = np.linalg.norm(np.array(eye_points[0]) - np.array(eye_points[3]))
-        
+
+        # Vertical distances 1-5 and 2-4, horizontal distance 0-3
+        v1, v2, h = np.linalg.norm(points[[1, 2, 0]] - points[[5, 4, 3]], axis=1)
         return (v1 + v2) / (2.0 * h) if h > 0 else 0.0
-        
-    def calculate_mar(self, mouth_points: List[Tuple[float, float, float]]) -> float:
-        """Calculate mouth aspect ratio"""
-        if not mouth_points or len(mouth_points) != 6:
+
+    def calculate_mar(self, mouth_points) -> float:
+        """Calculate mouth aspect ratio from the six MOUTH points"""
+        points = np.asarray(mouth_points, dtype=np.float64)
+        if points.shape != (6, 3):
             return 0.0
-            
-        # Vertical distance
-        v = np.linalg.norm(np.array(mouth_points[1]) - np.array(mouth_points[4]))
-        
-        # Horizontal distance
-        h = np.linalg.norm(np.array(mouth_points[0]) - np.array(mouth_points[3]))
-        
+
+        # Vertical distance 1-4, horizontal distance 0-3
+        v, h = np.linalg.norm(points[[1, 0]] - points[[4, 3]], axis=1)
         return v / h if h > 0 else 0.0
 
-    def detect_face(self, frame: np.ndarray) -> FaceMetrics:
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(frame_rgb)
-        
+    def _inference_rgb(self, frame: np.ndarray) -> np.ndarray:
+        """frame as RGB at inference resolution, in buffers reused across frames."""
+        h, w = frame.shape[:2]
+        if self.inference_width and w > self.inference_width:
+            size = (self.inference_width, max(1, int(round(h * self.inference_width / w))))
+            if self._resized is None or self._resized.shape[1::-1] != size:
+                self._resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            with self.timer.stage("video.resize", items=1):
+                frame = cv2.resize(frame, size, dst=self._resized, interpolation=cv2.INTER_LINEAR)
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._rgb = np.empty_like(frame)
+        with self.timer.stage("video.cvt_color", items=1):
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+
+    def detect_landmarks(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """FaceMesh landmarks of the first face as a (468, 3) float32 array, or None.
+
+        x and y are in pixels of frame; z is MediaPipe's relative depth.
+        """
+        frame_rgb = self._inference_rgb(frame)
+        with self.timer.stage("video.face_mesh", items=1):
+            results = self.face_mesh.process(frame_rgb)
+
         if not results.multi_face_landmarks:
+            return None
+
+        h, w = frame.shape[:2]
+        with self.timer.stage("video.landmarks", items=1):
+            landmarks = _landmark_array(results.multi_face_landmarks[0])
+            landmarks[:, 0] *= w
+            landmarks[:, 1] *= h
+        return landmarks
+
+    def detect_face(self, frame: np.ndarray) -> FaceMetrics:
+        landmarks = self.detect_landmarks(frame)
+        if landmarks is None:
             return FaceMetrics(
                 face_detected=False,
                 eye_aspect_ratio=0.0,
                 mouth_aspect_ratio=0.0,
                 head_pose=(0.0, 0.0, 0.0)
             )
-        
-        face_landmarks = results.multi_face_landmarks[0]
-        h, w, _ = frame.shape
-        landmarks_3d = []
-        
-        # Extract 3D landmarks
-        for landmark in face_landmarks.landmark:
-            x = landmark.x * w
-            y = landmark.y * h
-            z = landmark.z
-            landmarks_3d.append((x, y, z))
-        
-        # Calculate metrics
-        left_eye_points = [landmarks_3d[i] for i in self.LEFT_EYE]
-        right_eye_points = [landmarks_3d[i] for i in self.RIGHT_EYE]
-        mouth_points = [landmarks_3d[i] for i in self.MOUTH]
-        
-        ear = (self.calculate_ear(left_eye_points) + self.calculate_ear(right_eye_points)) / 2
-        mar = self.calculate_mar(mouth_points)
-        
-        # Estimate head pose
-        nose_tip = landmarks_3d[1]  # Using nose tip as reference
-        left_eye = landmarks_3d[33]  # Left eye corner
-        right_eye = landmarks_3d[263]  # Right eye corner
-        
-        # Simple head pose estimation
-        pitch = np.arctan2(nose_tip[1] - (left_eye[1] + right_eye[1])/2, nose_tip[2])
-        yaw = np.arctan2(nose_tip[0] - (left_eye[0] + right_eye[0])/2, nose_tip[2])
-        roll = np.arctan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0])
-        
+
+        with self.timer.stage("video.face_metrics", items=1):
+            return self._face_metrics(landmarks)
+
+    def face_metrics_batch(self, landmarks: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """EAR, MAR and (pitch, yaw, roll) of landmark arrays shaped (..., 468, 3).
+
+        Returns arrays shaped (...), (...) and (..., 3); a single (468, 3)
+        face gives scalars and a 3-vector. Same formulas as calculate_ear,
+        calculate_mar and the nose/eye-corner head pose, but the points are
+        gathered once and every ratio and angle comes from a few matrix
+        products, so the cost per call barely depends on how many faces.
+        """
+        points = landmarks[..., self._metric_points, :].astype(np.float64)
+        distances = np.linalg.norm(points[..., :8, :] - points[..., 8:16, :], axis=-1)
+        numerators = distances @ self._ratio_numerators
+        denominators = distances @ self._ratio_denominators
+        ratios = np.divide(numerators, denominators, out=np.zeros_like(numerators), where=denominators > 0)
+
+        pose_points = points[..., 16:, :].reshape(points.shape[:-2] + (9,))
+        head_pose = np.arctan2(pose_points @ self._pose_numerators, pose_points @ self._pose_denominators)
+        return (ratios[..., 0] + ratios[..., 1]) / 2, ratios[..., 2], head_pose
+
+    def _face_metrics(self, landmarks: np.ndarray) -> FaceMetrics:
+        ear, mar, head_pose = self.face_metrics_batch(landmarks)
         return FaceMetrics(
             face_detected=True,
-            eye_aspect_ratio=ear,
-            mouth_aspect_ratio=mar,
-            head_pose=(pitch, yaw, roll),
-            face_landmarks=landmarks_3d
+            eye_aspect_ratio=float(ear),
+            mouth_aspect_ratio=float(mar),
+            head_pose=(float(head_pose[0]), float(head_pose[1]), float(head_pose[2])),
+            face_landmarks=landmarks
         )
 
 class EnhancedActivityAnalyzer:
-    def __init__(self):
-        self.face_detector = EnhancedFaceDetector()
-        self.activity_history = {
-            "face_movements": [],
-            "eye_movements": [],
-            "mouth_movements": [],
-            "head_movements": [],
-            "timestamps": []
-        }
+    NO_MOVEMENT = {
+        "face_movement": 0.0,
+        "eye_movement": 0.0,
+        "mouth_movement": 0.0,
+        "head_movement": 0.0
+    }
+
+    def __init__(self, target_fps: Optional[float] = None, spike_threshold: float = 0.5,
+                 burst_seconds: float = 2.0, queue_depth: int = 0, timer: Optional[StageTimer] = None,
+                 inference_width: Optional[int] = None, metrics_chunk: int = 1,
+                 motion_threshold: Optional[float] = None, gate_width: int = 64, max_gated_frames: int = 30):
+        self.timer = timer or StageTimer(enabled=False)
+        # Motion gate: a frame whose gate_width-wide grayscale thumbnail differs from
+        # the last FaceMesh frame's by less than motion_threshold grey levels in every
+        # thumbnail pixel (e.g. 8) reuses that result with zero movement. Each pixel
+        # averages a block of the frame, so sensor noise stays well below that while
+        # a blink still shows up; a whole-frame mean would dilute it. FaceMesh runs
+        # again after max_gated_frames gated frames in a row. None disables the gate.
+        self.motion_threshold = motion_threshold
+        self.gate_width = gate_width
+        self.max_gated_frames = max_gated_frames
+        self._gate_buffers: Dict[str, np.ndarray] = {}
+        self._gate_reference: Optional[np.ndarray] = None
+        self._gated_run = 0
+        self._gate_stats = {"frames_checked": 0, "frames_gated": 0, "forced_refreshes": 0}
+        self._last_face_detected = False
+        self.inference_width = inference_width
+        # metrics_chunk > 1 collects that many frames' landmarks and computes their
+        # metrics and movements in one batch; see _flush_chunk
+        self.metrics_chunk = metrics_chunk
+        self._chunk_landmarks = np.empty((metrics_chunk, 468, 3), dtype=np.float32) if metrics_chunk > 1 else None
+        self._chunk_rows: List[int] = []
+        self._chunk_frames: List[int] = []
+        self.face_detector = EnhancedFaceDetector(self.timer, inference_width)
+        # Adaptive sampling: analyze ~target_fps frames per second and fall back to
+        # full rate for burst_seconds after a head/mouth movement spike.
+        self.target_fps = target_fps
+        self.spike_threshold = spike_threshold
+        self.burst_seconds = burst_seconds
+        self._full_rate_until = -1
+        self._frames_decoded = 0
+        self._next_sample = 0
+        self._first_detection: Optional[Tuple[int, FaceMetrics]] = None
+        # queue_depth > 0 decodes on a background thread feeding a bounded queue
+        self.queue_depth = queue_depth
+        self._pipeline_stats: Dict = {}
+        self.activity_history = ActivityTimeline()
         self.prev_metrics: Optional[FaceMetrics] = None
+        # Source frame index prev_metrics was measured on; spikes are per frame of this gap
+        self._metrics_frame: Optional[int] = None
         
+    def reset(self):
+        """Clear per-video state so the analyzer can be reused for another session."""
+        self.face_detector.reset()
+        self.activity_history.clear()
+        self.prev_metrics = None
+        self._metrics_frame = None
+        self._reset_gate()
+
+    def _reset_gate(self):
+        self._gate_reference = None
+        self._gated_run = 0
+        self._last_face_detected = False
+        for key in self._gate_stats:
+            self._gate_stats[key] = 0
+
+    def _gate_thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """Grayscale gate_width-wide thumbnail of frame, in buffers reused across frames.
+
+        A bilinear resize to 4x the thumbnail and a 4x4 area average cost about
+        0.25 ms at any input size; a single INTER_AREA resize of a 1080p frame
+        costs 2 ms, and a single bilinear one passes sensor noise straight through.
+        """
+        h, w = frame.shape[:2]
+        size = (self.gate_width, max(1, int(round(h * self.gate_width / w))))
+        buffers = self._gate_buffers
+        if buffers.get("size") != size:
+            buffers.clear()
+            buffers["size"] = size
+            buffers["resized"] = np.empty((size[1] * 4, size[0] * 4, 3), dtype=np.uint8)
+            buffers["gray"] = np.empty((size[1] * 4, size[0] * 4), dtype=np.uint8)
+            buffers["thumbnails"] = [np.empty((size[1], size[0]), dtype=np.uint8) for _ in range(2)]
+            self._gate_reference = None
+        cv2.resize(frame, (size[0] * 4, size[1] * 4), dst=buffers["resized"], interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(buffers["resized"], cv2.COLOR_BGR2GRAY, dst=buffers["gray"])
+        # Alternate between two thumbnails so the reference is never overwritten
+        thumbnail = buffers["thumbnails"][0] if buffers["thumbnails"][0] is not self._gate_reference \
+            else buffers["thumbnails"][1]
+        return cv2.resize(buffers["gray"], size, dst=thumbnail, interpolation=cv2.INTER_AREA)
+
+    def _motion_gated(self, frame: np.ndarray) -> bool:
+        """Whether frame is close enough to the last FaceMesh frame to reuse its result."""
+        if self.motion_threshold is None:
+            return False
+        with self.timer.stage("video.motion_gate", items=1):
+            thumbnail = self._gate_thumbnail(frame)
+            stats = self._gate_stats
+            stats["frames_checked"] += 1
+            if self._gate_reference is not None:
+                if self._gated_run >= self.max_gated_frames:
+                    stats["forced_refreshes"] += 1
+                elif cv2.norm(thumbnail, self._gate_reference, cv2.NORM_INF) < self.motion_threshold:
+                    self._gated_run += 1
+                    stats["frames_gated"] += 1
+                    return True
+            self._gate_reference = thumbnail
+            self._gated_run = 0
+            return False
+
+    def _gated_results(self) -> Dict[str, float]:
+        # The reused result: a face is still present if the last FaceMesh run found one
+        return {**self.NO_MOVEMENT, "face_movement": 1.0 if self._last_face_detected else 0.0}
+
+    def _gate_summary(self, stats: Optional[Dict] = None) -> Dict:
+        stats = stats or self._gate_stats
+        return {
+            "motion_threshold": self.motion_threshold,
+            "gate_width": self.gate_width,
+            "max_gated_frames": self.max_gated_frames,
+            **stats,
+            "gate_hit_rate": round(stats["frames_gated"] / stats["frames_checked"], 4) if stats["frames_checked"] else 0.0
+        }
+
     def calculate_movement(self, current: float, previous: float, threshold: float = 0.1) -> float:
         if previous is None:
             return 0.0
         return 1.0 if abs(current - previous) > threshold else 0.0
         
     def process_frame(self, frame: np.ndarray) -> Dict[str, float]:
+        if self._motion_gated(frame):
+            return self._gated_results()
+
         metrics = self.face_detector.detect_face(frame)
+        self._last_face_detected = metrics.face_detected
         
         if not metrics.face_detected:
             return {
@@ -132,8 +472,16 @@ class EnhancedActivityAnalyzer:
                 "head_movement": 0.0
             }
         
-        if self.prev_metrics is None:
-            self.prev_metrics = metrics
+        frame_results = self._compare_metrics(metrics, self.prev_metrics)
+        
+        # Update previous metrics
+        self.prev_metrics = metrics
+        
+        return frame_results
+
+    def _compare_metrics(self, metrics: FaceMetrics, prev_metrics: Optional[FaceMetrics]) -> Dict[str, float]:
+        """Movement of a detected face relative to the previous detected face."""
+        if prev_metrics is None:
             return {
                 "face_movement": 1.0,
                 "eye_movement": 0.0,
@@ -142,18 +490,15 @@ class EnhancedActivityAnalyzer:
             }
         
         # Calculate movements
-        eye_movement = self.calculate_movement(metrics.eye_aspect_ratio, self.prev_metrics.eye_aspect_ratio, 0.05)
-        mouth_movement = self.calculate_movement(metrics.mouth_aspect_ratio, self.prev_metrics.mouth_aspect_ratio, 0.1)
+        eye_movement = self.calculate_movement(metrics.eye_aspect_ratio, prev_metrics.eye_aspect_ratio, 0.05)
+        mouth_movement = self.calculate_movement(metrics.mouth_aspect_ratio, prev_metrics.mouth_aspect_ratio, 0.1)
         
         # Head movement calculation
         head_movement = sum(
             abs(current - prev) for current, prev in 
-            zip(metrics.head_pose, self.prev_metrics.head_pose)
+            zip(metrics.head_pose, prev_metrics.head_pose)
         ) / 3.0
         
-        # Update previous metrics
-        self.prev_metrics = metrics
-        
         return {
             "face_movement": 1.0 if metrics.face_detected else 0.0,
             "eye_movement": eye_movement,
@@ -161,28 +506,446 @@ class EnhancedActivityAnalyzer:
             "head_movement": min(1.0, head_movement)
         }
         
-    def process_video(self, video_path: str) -> Dict:
-        cap = cv2.VideoCapture(video_path)
-        frame_count = 0
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
+    def _sampling_step(self, source_fps: float) -> int:
+        if not self.target_fps or source_fps <= 0 or self.target_fps >= source_fps:
+            return 1
+        return max(1, int(round(source_fps / self.target_fps)))
+
+    def _sampled_frames(self, cap, step: int, start: int = 0, stop: Optional[int] = None, buffers: int = 1,
+                        next_sample: Optional[int] = None):
+        """Yield (frame_index, pts_ms, frame) for frames selected by the sampling policy.
+
+        Skipped frames are only grabbed, never retrieved, so they cost a demux
+        and decode but no colour conversion or FaceMesh call. The capture must
+        already be positioned at frame ``start``. The first frame sampled is
+        ``next_sample`` (default: ``start``), and the one due after ``stop``
+        is left in self._next_sample. Frames are read into a ring of
+        ``buffers`` reused arrays, so a yielded frame stays valid only until
+        ``buffers`` more frames have been read.
+        """
+        ring = [None] * buffers
+        retrieved = 0
+        frame_index = start
+        next_sample = start if next_sample is None else next_sample
+        while cap.isOpened() and (stop is None or frame_index < stop):
+            if frame_index < next_sample and frame_index > self._full_rate_until:
+                with self.timer.stage("video.grab", items=1):
+                    grabbed = cap.grab()
+                if not grabbed:
+                    break
+                frame_index += 1
+                continue
+
+            slot = retrieved % buffers
+            with self.timer.stage("video.decode", items=1):
+                ret, frame = cap.read(ring[slot])
             if not ret:
                 break
-                
-            frame_results = self.process_frame(frame)
-            
-            self.activity_history["face_movements"].append(frame_results["face_movement"])
-            self.activity_history["eye_movements"].append(frame_results["eye_movement"])
-            self.activity_history["mouth_movements"].append(frame_results["mouth_movement"])
-            self.activity_history["head_movements"].append(frame_results["head_movement"])
-            self.activity_history["timestamps"].append(datetime.now().isoformat())
-            
-            frame_count += 1
+            ring[slot] = frame
+            retrieved += 1
+            yield frame_index, int(round(cap.get(cv2.CAP_PROP_POS_MSEC))), frame
+            frame_index += 1
+            next_sample = frame_index + step - 1
+        self._frames_decoded = frame_index - start
+        self._next_sample = next_sample
+
+    def _demuxed_frames(self, frames: Iterable, step: int):
+        """Apply the sampling policy to (frame_index, pts_ms, frame) decoded elsewhere.
+
+        The frames come from e.g. MediaDemuxer.frames(), which has already
+        decoded every one of them; skipping a frame still saves its colour
+        conversion and FaceMesh call.
+        """
+        frames = iter(frames)
+        frame_index = 0
+        next_sample = 0
+        try:
+            while True:
+                skip = frame_index < next_sample and frame_index > self._full_rate_until
+                with self.timer.stage("video.grab" if skip else "video.decode", items=1):
+                    item = next(frames, None)
+                if item is None:
+                    break
+                frame_index += 1
+                if skip:
+                    continue
+                yield item
+                next_sample = frame_index + step - 1
+        finally:
+            self._frames_decoded = frame_index
+            if hasattr(frames, "close"):
+                frames.close()
+
+    def _pipelined_frames(self, cap, step: int, start: int = 0, stop: Optional[int] = None,
+                          next_sample: Optional[int] = None):
+        """Yield sampled frames decoded on a background thread.
+
+        The decoder runs ahead of inference by at most queue_depth frames, so a
+        movement spike switches it to full rate with up to that many frames of lag.
+        """
+        frames = queue.Queue(maxsize=self.queue_depth)
+        cancelled = threading.Event()
+        errors = []
+        stats = {
+            "queue_depth": self.queue_depth,
+            "decoder_stalls": 0,
+            "decoder_stall_seconds": 0.0,
+            "inference_stalls": 0,
+            "inference_stall_seconds": 0.0
+        }
+        self._pipeline_stats = stats
+
+        def put(item) -> bool:
+            try:
+                frames.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+            stats["decoder_stalls"] += 1
+            wait_start = time.perf_counter()
+            try:
+                while not cancelled.is_set():
+                    try:
+                        frames.put(item, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+            finally:
+                stats["decoder_stall_seconds"] += time.perf_counter() - wait_start
+
+        def decode():
+            try:
+                # A frame can sit in the queue while the next one is decoded and the
+                # previous one is still in inference, hence two buffers beyond the queue
+                for item in self._sampled_frames(cap, step, start, stop, self.queue_depth + 2, next_sample):
+                    if not put(item):
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(None)
+
+        decoder = threading.Thread(target=decode, name="frame-decoder", daemon=True)
+        decoder.start()
+        try:
+            while True:
+                try:
+                    item = frames.get_nowait()
+                except queue.Empty:
+                    stats["inference_stalls"] += 1
+                    wait_start = time.perf_counter()
+                    item = frames.get()
+                    stats["inference_stall_seconds"] += time.perf_counter() - wait_start
+                if item is None:
+                    break
+                yield item
+        finally:
+            cancelled.set()
+            decoder.join()
+
+        if errors:
+            raise errors[0]
+
+    def _queue_frame(self, frame_index: int, pts_ms: int, frame: np.ndarray):
+        """Run FaceMesh on frame and leave its metrics to the next _flush_chunk."""
+        if self._motion_gated(frame):
+            self.activity_history.append(frame_index, pts_ms, self._gated_results())
+            return
+        landmarks = self.face_detector.detect_landmarks(frame)
+        self._last_face_detected = landmarks is not None
+        self.activity_history.append(frame_index, pts_ms, self.NO_MOVEMENT)
+        if landmarks is not None:
+            self._chunk_landmarks[len(self._chunk_rows)] = landmarks
+            self._chunk_rows.append(len(self.activity_history) - 1)
+            self._chunk_frames.append(frame_index)
+
+    def _flush_chunk(self, burst_frames: int):
+        """Metrics and movements of the queued detected frames, as process_frame computes them.
+
+        Frames without a face keep the zero scores they were appended with.
+        Movement spikes are only seen here, so a burst of full-rate sampling
+        starts up to metrics_chunk frames late.
+        """
+        count = len(self._chunk_rows)
+        if count == 0:
+            return
+        landmarks = self._chunk_landmarks[:count]
+        rows = np.asarray(self._chunk_rows)
+        with self.timer.stage("video.face_metrics", items=count):
+            ear, mar, head_pose = self.face_detector.face_metrics_batch(landmarks)
+            previous = self.prev_metrics
+            frames = np.asarray(self._chunk_frames)
+            gaps = np.diff(frames, prepend=frames[0] - 1 if self._metrics_frame is None else self._metrics_frame)
+            if previous is not None:
+                ear_before = np.concatenate(([previous.eye_aspect_ratio], ear[:-1]))
+                mar_before = np.concatenate(([previous.mouth_aspect_ratio], mar[:-1]))
+                pose_before = np.concatenate(([previous.head_pose], head_pose[:-1]))
+            else:
+                ear_before, mar_before, pose_before = np.roll(ear, 1), np.roll(mar, 1), np.roll(head_pose, 1, axis=0)
+
+            scores = np.empty((count, len(ActivityTimeline.COLUMNS)))
+            scores[:, 0] = 1.0
+            scores[:, 1] = np.abs(ear - ear_before) > 0.05
+            scores[:, 2] = np.abs(mar - mar_before) > 0.1
+            head_change = np.abs(head_pose - pose_before).sum(axis=1) / 3.0
+            scores[:, 3] = np.minimum(1.0, head_change)
+            if previous is None:
+                # The first face ever seen has nothing to move relative to
+                scores[0, 1:] = 0.0
+            self.activity_history.set_rows(rows, scores)
+
+        if self._first_detection is None:
+            self._first_detection = (int(rows[0]), FaceMetrics(
+                True, float(ear[0]), float(mar[0]), tuple(float(angle) for angle in head_pose[0])))
+        self.prev_metrics = FaceMetrics(True, float(ear[-1]), float(mar[-1]),
+                                        tuple(float(angle) for angle in head_pose[-1]), landmarks[-1].copy())
+        self._metrics_frame = int(frames[-1])
+
+        if burst_frames:
+            spiked = self._is_spike(np.abs(mar - mar_before), head_change, gaps)
+            if previous is None:
+                spiked[0] = False
+            spikes = np.flatnonzero(spiked)
+            if len(spikes):
+                self._full_rate_until = max(self._full_rate_until, int(frames[spikes[-1]]) + burst_frames)
+        self._chunk_rows.clear()
+        self._chunk_frames.clear()
+
+    def _is_spike(self, mouth_change, head_change, gap):
+        """Whether the mouth or head moved faster than a spike per source frame.
+
+        Sampled frames are ``gap`` source frames apart, so their changes are
+        divided by the gap before the thresholds of _compare_metrics are
+        applied; at full rate this is the per-frame test. Takes scalars or
+        the arrays of a metrics chunk.
+        """
+        head_rate = np.minimum(1.0, head_change / gap)
+        mouth_rate = np.where(mouth_change / gap > 0.1, 1.0, 0.0)
+        return (head_rate >= self.spike_threshold) | (mouth_rate >= self.spike_threshold)
+
+    def _analyze_frames(self, cap, step: int, burst_frames: int, start: int = 0,
+                        stop: Optional[int] = None, cancelled: Optional[threading.Event] = None,
+                        decoded: Optional[Iterable] = None, full_rate_until: int = -1,
+                        next_sample: Optional[int] = None) -> int:
+        """Run the frame loop over [start, stop) and return the number of frames analyzed.
+
+        With ``decoded`` frames, cap is unused and the frames are read from it.
+        ``full_rate_until`` and ``next_sample`` resume the sampling policy of
+        a run that stopped at ``start``. Raises CancelledError at the next
+        frame once ``cancelled`` is set.
+        """
+        self._full_rate_until = full_rate_until
+        self._frames_decoded = 0
+        self._first_detection = None
+        frame_count = 0
+
+        if decoded is not None:
+            frames = self._demuxed_frames(decoded, step)
+        elif self.queue_depth > 0:
+            frames = self._pipelined_frames(cap, step, start, stop, next_sample)
+        else:
+            frames = self._sampled_frames(cap, step, start, stop, next_sample=next_sample)
+
+        self._chunk_rows.clear()
+        self._chunk_frames.clear()
+        # The gate compares against frames of this run only
+        self._reset_gate()
+        try:
+            for frame_index, pts_ms, frame in frames:
+                if cancelled is not None and cancelled.is_set():
+                    raise CancelledError("Video analysis cancelled")
+                if self.metrics_chunk > 1:
+                    self._queue_frame(frame_index, pts_ms, frame)
+                    frame_count += 1
+                    if frame_count % self.metrics_chunk == 0:
+                        self._flush_chunk(burst_frames)
+                    continue
+
+                previous, previous_frame = self.prev_metrics, self._metrics_frame
+                frame_results = self.process_frame(frame)
+                self.activity_history.append(frame_index, pts_ms, frame_results)
+
+                # Remember the first detected face; it is the only result of this
+                # run that depends on state from before `start`.
+                if self._first_detection is None and frame_results["face_movement"] == 1.0:
+                    self._first_detection = (len(self.activity_history) - 1,
+                                             replace(self.prev_metrics, face_landmarks=None))
             
+                if self.prev_metrics is not previous:
+                    self._metrics_frame = frame_index
+                    if burst_frames and previous is not None and self._is_spike(
+                            abs(self.prev_metrics.mouth_aspect_ratio - previous.mouth_aspect_ratio),
+                            sum(abs(current - prev) for current, prev in
+                                zip(self.prev_metrics.head_pose, previous.head_pose)) / 3.0,
+                            frame_index - previous_frame if previous_frame is not None else 1):
+                        self._full_rate_until = frame_index + burst_frames
+
+                frame_count += 1
+            if self.metrics_chunk > 1:
+                self._flush_chunk(burst_frames)
+        finally:
+            frames.close()
+
+        return frame_count
+
+    def _burst_frames(self, source_fps: float, step: int) -> int:
+        return int(round(self.burst_seconds * source_fps)) if step > 1 else 0
+
+    def process_video(self, video_path: str, cancelled: Optional[threading.Event] = None) -> Dict:
+        cap = cv2.VideoCapture(video_path)
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        step = self._sampling_step(source_fps)
+        self.activity_history.reserve(len(self.activity_history) +
+                                      int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) // step + 1)
+        try:
+            frame_count = self._analyze_frames(cap, step, self._burst_frames(source_fps, step),
+                                               cancelled=cancelled)
+        finally:
+            cap.release()
+
+        report = self._generate_report(frame_count)
+        report["sampling"] = self._sampling_summary(source_fps, step, self._frames_decoded, frame_count)
+        if self.motion_threshold is not None:
+            report["motion_gate"] = self._gate_summary()
+        if self.queue_depth > 0:
+            report["pipeline"] = {
+                **self._pipeline_stats,
+                "decoder_stall_seconds": round(self._pipeline_stats["decoder_stall_seconds"], 3),
+                "inference_stall_seconds": round(self._pipeline_stats["inference_stall_seconds"], 3)
+            }
+        return report
+
+    def process_frames(self, frames: Iterable, source_fps: float, total_frames: int = 0,
+                       cancelled: Optional[threading.Event] = None) -> Dict:
+        """process_video over (frame_index, pts_ms, frame) decoded elsewhere, e.g. by MediaDemuxer.
+
+        The decoder already runs apart from inference, so queue_depth is not used.
+        """
+        step = self._sampling_step(source_fps)
+        self.activity_history.reserve(len(self.activity_history) + total_frames // step + 1)
+        frame_count = self._analyze_frames(None, step, self._burst_frames(source_fps, step),
+                                           cancelled=cancelled, decoded=frames)
+
+        report = self._generate_report(frame_count)
+        report["sampling"] = self._sampling_summary(source_fps, step, self._frames_decoded, frame_count)
+        if self.motion_threshold is not None:
+            report["motion_gate"] = self._gate_summary()
+        return report
+
+    def _shard_config(self) -> Dict:
+        return {
+            "target_fps": self.target_fps,
+            "spike_threshold": self.spike_threshold,
+            "burst_seconds": self.burst_seconds,
+            "queue_depth": self.queue_depth,
+            "inference_width": self.inference_width,
+            "metrics_chunk": self.metrics_chunk,
+            "motion_threshold": self.motion_threshold,
+            "gate_width": self.gate_width,
+            "max_gated_frames": self.max_gated_frames
+        }
+
+    def process_video_sharded(self, video_path: str, num_shards: Optional[int] = None,
+                              cancelled: Optional[threading.Event] = None) -> Dict:
+        """Analyze a video as contiguous frame ranges in parallel worker processes.
+
+        Every shard runs its own EnhancedFaceDetector. When the shards are merged,
+        the first detected face of each shard is re-scored against the last
+        detected face of the shards before it. Each worker first replays the
+        sampling policy over the frames before its range (at least
+        SHARD_WARMUP_FRAMES, and a whole burst when sampling), which primes
+        FaceMesh tracking and carries a burst or the sampling phase across the
+        boundary. FaceMesh tracking is path dependent, so landmarks, and the
+        spikes that start bursts, can still differ from a sequential run; the
+        report's sharding section is marked approximate. Without sampling the
+        same frames are analyzed. With it, a chain of bursts running into a
+        shard is only carried over if it started within the lead-in, so the
+        frames analyzed can differ too. The activity_metrics are expected to
+        stay within SHARD_TOLERANCE percentage points of a sequential run's
+        (tests/test_sharding.py checks this); per-frame scores and window
+        flags near a boundary are not bounded. ``cancelled`` is
+        checked before the workers start and when they return; shards that
+        are already running finish first.
+        """
+        cap = cv2.VideoCapture(video_path)
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
         cap.release()
-        
-        return self._generate_report(frame_count)
+
+        num_shards = num_shards or os.cpu_count() or 1
+        step = self._sampling_step(source_fps)
+        if num_shards <= 1 or total_frames < num_shards * step:
+            return self.process_video(video_path, cancelled)
+
+        # Align shard starts to the sampling step so sampled frames match a sequential run
+        shard_size = -(-total_frames // num_shards)
+        shard_size = -(-shard_size // step) * step
+        bounds = [(start, start + shard_size) for start in range(0, total_frames, shard_size)]
+        # The container frame count can be off; let the last shard read to the end
+        bounds[-1] = (bounds[-1][0], None)
+
+        if cancelled is not None and cancelled.is_set():
+            raise CancelledError("Video analysis cancelled")
+        config = self._shard_config()
+        # Spawn, not fork: MediaPipe graphs and OpenCV thread pools are not fork-safe
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(bounds), mp_context=context) as executor:
+            shards = list(executor.map(_analyze_shard, [video_path] * len(bounds),
+                                       [start for start, _ in bounds], [stop for _, stop in bounds],
+                                       [config] * len(bounds), [self.timer.enabled] * len(bounds)))
+        if cancelled is not None and cancelled.is_set():
+            raise CancelledError("Video analysis cancelled")
+
+        frame_count = 0
+        frames_decoded = 0
+        gate_stats = dict.fromkeys(self._gate_stats, 0)
+        carry = self.prev_metrics
+        for shard in shards:
+            offset = len(self.activity_history)
+            self.activity_history.extend(shard["history"])
+
+            if carry is not None and shard["first_detection"] is not None:
+                index, metrics = shard["first_detection"]
+                self.activity_history.set_scores(offset + index, self._compare_metrics(metrics, carry))
+
+            if shard["last_detection"] is not None:
+                carry = shard["last_detection"]
+            frame_count += shard["frames_analyzed"]
+            frames_decoded += shard["frames_decoded"]
+            for key, value in shard["gate_stats"].items():
+                gate_stats[key] += value
+            # Stage times are summed across workers, so they can exceed wall time
+            self.timer.merge(shard["timings"])
+        self.prev_metrics = carry
+
+        report = self._generate_report(frame_count)
+        report["sampling"] = self._sampling_summary(source_fps, step, frames_decoded, frame_count)
+        report["sharding"] = {
+            "shards": len(bounds),
+            "boundaries": [start for start, _ in bounds],
+            "lead_in_frames": max(shard["lead_in_frames"] for shard in shards),
+            # Per-frame scores after the first boundary depend on FaceMesh's
+            # tracking state, which a worker cannot reproduce exactly
+            "approximate": True,
+            "tolerance_percentage_points": SHARD_TOLERANCE
+        }
+        if self.motion_threshold is not None:
+            report["motion_gate"] = self._gate_summary(gate_stats)
+        return report
+
+    def _sampling_summary(self, source_fps: float, step: int, frames_decoded: int, frames_analyzed: int) -> Dict:
+        """Describe the rate the metrics were computed at, so reports are comparable."""
+        duration = frames_decoded / source_fps if source_fps > 0 else 0.0
+        return {
+            "source_fps": round(source_fps, 3),
+            "target_fps": self.target_fps,
+            "inference_width": self.inference_width,
+            "sampling_step": step,
+            "frames_decoded": frames_decoded,
+            "frames_analyzed": frames_analyzed,
+            "effective_fps": round(frames_analyzed / duration, 3) if duration > 0 else 0.0
+        }
         
     def _generate_report(self, total_frames: int) -> Dict:
         if total_frames == 0:
@@ -197,14 +960,11 @@ class EnhancedActivityAnalyzer:
                 "timestamps": []
             }
             
-        face_activity = np.mean(self.activity_history["face_movements"]) * 100
-        eye_activity = np.mean(self.activity_history["eye_movements"]) * 100
-        mouth_activity = np.mean(self.activity_history["mouth_movements"]) * 100
-        head_activity = np.mean(self.activity_history["head_movements"]) * 100
+        means = self.activity_history.scores.mean(axis=0, dtype=np.float64) * 100
+        face_activity, eye_activity, mouth_activity, head_activity = (float(value) for value in means)
         
         # Calculate blink rate (when EAR drops significantly)
-        blinks = sum(1 for i in range(1, len(self.activity_history["eye_movements"]))
-                    if self.activity_history["eye_movements"][i] > 0.8)
+        blinks = int(np.count_nonzero(self.activity_history["eye_movements"][1:] > 0.8))
         blink_rate = (blinks / total_frames) * 100
         
         # Overall activity score
@@ -223,10 +983,83 @@ class EnhancedActivityAnalyzer:
             },
         }
         
+    def window_metrics(self, window_seconds: float = 60.0, hop_seconds: Optional[float] = None,
+                       burst_threshold: float = 0.5) -> Dict[str, np.ndarray]:
+        """The activity_metrics of _generate_report per time window of the timeline.
+
+        Returns one array per activity_metrics key, one entry per window, so
+        that short bursts are not diluted by the rest of the session. It also
+        returns start_ms, end_ms, frames, and the per-column peak_* maxima
+        and bursts_* counts from ActivityTimeline.windows.
+        """
+        window_ms = int(round(window_seconds * 1000))
+        hop_ms = int(round(hop_seconds * 1000)) if hop_seconds else window_ms
+        windows = self.activity_history.windows(window_ms, hop_ms, burst_threshold)
+        face_activity, eye_activity, mouth_activity, head_activity = (windows["mean"] * 100).T
+
+        blinks = np.zeros(len(self.activity_history) + 1, dtype=np.int64)
+        np.cumsum(self.activity_history["eye_movements"] > 0.8, out=blinks[1:])
+        window_blinks = blinks[windows["stop_row"]] - blinks[windows["start_row"]]
+        blink_rate = np.divide(window_blinks * 100, windows["frames"], out=np.zeros(len(window_blinks)),
+                               where=windows["frames"] > 0)
+
+        metrics = {
+            "start_ms": windows["start_ms"],
+            "end_ms": windows["end_ms"],
+            "frames": windows["frames"],
+            "face_activity_percentage": face_activity,
+            "body_activity_percentage": head_activity,
+            "eye_activity_percentage": eye_activity,
+            "blink_rate": blink_rate,
+            "overall_activity_score": (face_activity * 0.2 + eye_activity * 0.3 +
+                                       mouth_activity * 0.2 + head_activity * 0.3)
+        }
+        for column, name in enumerate(ActivityTimeline.COLUMNS):
+            metrics[f"peak_{name}"] = windows["max"][:, column]
+            metrics[f"bursts_{name}"] = windows["bursts"][:, column]
+        return metrics
+
     def save_report(self, report: Dict, output_path: str):
         with open(output_path, 'w') as f:
             json.dump(report, f, indent=4)
 
+def _analyze_shard(video_path: str, start: int, stop: Optional[int], config: Dict,
+                   instrument: bool = False) -> Dict:
+    """Worker entry point for EnhancedActivityAnalyzer.process_video_sharded."""
+    analyzer = EnhancedActivityAnalyzer(**config, timer=StageTimer(enabled=instrument))
+    cap = cv2.VideoCapture(video_path)
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    step = analyzer._sampling_step(source_fps)
+    burst_frames = analyzer._burst_frames(source_fps, step)
+    # Shard starts are multiples of step, so the lead-in starts on a sampled frame too
+    lead_in = -(-max(SHARD_WARMUP_FRAMES, burst_frames) // step) * step
+    lead_start = max(0, start - lead_in)
+    full_rate_until, next_sample = -1, None
+    try:
+        if lead_start < start:
+            # Run the frames before the shard as a sequential run would, so FaceMesh
+            # tracking is primed and a burst started there carries into the shard
+            cap.set(cv2.CAP_PROP_POS_FRAMES, lead_start)
+            analyzer._analyze_frames(cap, step, burst_frames, lead_start, start)
+            full_rate_until, next_sample = analyzer._full_rate_until, analyzer._next_sample
+            analyzer.activity_history.clear()
+        frame_count = analyzer._analyze_frames(cap, step, burst_frames, start, stop,
+                                               full_rate_until=full_rate_until, next_sample=next_sample)
+    finally:
+        cap.release()
+
+    last_detection = analyzer.prev_metrics
+    return {
+        "history": analyzer.activity_history,
+        "frames_analyzed": frame_count,
+        "frames_decoded": analyzer._frames_decoded,
+        "lead_in_frames": start - lead_start,
+        "first_detection": analyzer._first_detection,
+        "last_detection": replace(last_detection, face_landmarks=None) if last_detection else None,
+        "gate_stats": dict(analyzer._gate_stats),
+        "timings": analyzer.timer.summary()
+    }
+
 def main():
     video_path = "D:/ExamGuard/data/videos/1737528453707.mp4"  # Replace with your video path
     analyzer = EnhancedActivityAnalyzer()
@@ -1,11 +1,15 @@
 import cv2
 import math
 import numpy as np
-from typing import List, Optional, Tuple, Union
+from typing import Callable, List, Optional, Tuple, Union
 from dataclasses import dataclass
 import base64
 import json
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 @dataclass
@@ -32,13 +36,77 @@ class Detection:
     categories: List[Category]
 
 class FaceDetector:
-    def __init__(self):
+    """Haar cascade face detector.
+
+    detection_width downscales the frame before the face cascade runs, and
+    boxes are mapped back to full-resolution coordinates. With tracking
+    enabled, consecutive calls are treated as frames of one video. Each face
+    found in the previous frame is searched for only inside that box grown by
+    roi_margin, and only at scales near its previous size. A full-frame scan
+    runs every full_scan_interval frames, when no face is being tracked, or
+    when a tracked face is lost. New faces are therefore picked up at the next
+    full scan. Call reset() between videos.
+    """
+    def __init__(self, detection_width: Optional[int] = None, tracking: bool = False,
+                 full_scan_interval: int = 30, roi_margin: float = 0.5):
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        self.detection_width = detection_width
+        self.tracking = tracking
+        self.full_scan_interval = full_scan_interval
+        self.roi_margin = roi_margin
+        self.stats = {"full_scans": 0, "roi_scans": 0}
+        self.reset()
+
+    def reset(self):
+        """Forget tracked faces so the next frame gets a full scan"""
+        self._tracked_faces: List[Tuple[int, int, int, int]] = []
+        self._frames_since_full_scan = 0
+
+    def clone(self) -> "FaceDetector":
+        """A detector with the same settings and no tracked faces, e.g. for another thread"""
+        return type(self)(self.detection_width, self.tracking, self.full_scan_interval, self.roi_margin)
+
+    def _cascade_faces(self, gray: np.ndarray, scale: float, min_size: Tuple[int, int],
+                       max_size: Optional[Tuple[int, int]] = None) -> List[Tuple[int, int, int, int]]:
+        """Face boxes in gray's coordinates, detected on gray resized by scale"""
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale))),
+                              interpolation=cv2.INTER_AREA)
+        options = {"minSize": tuple(max(1, int(v * scale)) for v in min_size)}
+        if max_size is not None:
+            options["maxSize"] = tuple(max(1, int(v * scale)) for v in max_size)
+        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, **options)
+        return [tuple(int(round(v / scale)) for v in face) for face in faces]
+
+    def _track_faces(self, gray: np.ndarray, scale: float) -> Optional[List[Tuple[int, int, int, int]]]:
+        """Re-detect each tracked face near its last box, or None if any of them is lost"""
+        height, width = gray.shape[:2]
+        found = []
+        for x, y, w, h in self._tracked_faces:
+            margin_x, margin_y = int(w * self.roi_margin), int(h * self.roi_margin)
+            x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+            x1, y1 = min(width, x + w + margin_x), min(height, y + h + margin_y)
+            hits = self._cascade_faces(gray[y0:y1, x0:x1], scale,
+                                       min_size=(int(w * 0.7), int(h * 0.7)),
+                                       max_size=(int(w * 1.4), int(h * 1.4)))
+            if not hits:
+                return None
+            center_x, center_y = x + w / 2 - x0, y + h / 2 - y0
+            fx, fy, fw, fh = min(hits, key=lambda f: (f[0] + f[2] / 2 - center_x) ** 2 +
+                                                      (f[1] + f[3] / 2 - center_y) ** 2)
+            found.append((x0 + fx, y0 + fy, fw, fh))
+        return found
         
-    def detect_facial_features(self, roi_gray: np.ndarray, x: int, y: int, w: int, h: int, width: int, height: int) -> List[Keypoint]:
+    def detect_facial_features(self, roi_gray: np.ndarray, x: int, y: int, w: int, h: int, width: int, height: int,
+                               scale: float = 1.0) -> List[Keypoint]:
         keypoints = []
-        eyes = self.eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=5)
+        if scale < 1.0:
+            small = cv2.resize(roi_gray, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+            eyes = [tuple(int(round(v / scale)) for v in eye)
+                    for eye in self.eye_cascade.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5)]
+        else:
+            eyes = self.eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=5)
         if len(eyes) >= 2:
             eyes = sorted(eyes, key=lambda e: e[0])
             ex, ey, ew, eh = eyes[0]
@@ -95,21 +163,28 @@ class FaceDetector:
 
     def detect_faces(self, image: np.ndarray) -> List[Detection]:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
+        height, width = image.shape[:2]
+        scale = min(1.0, self.detection_width / width) if self.detection_width else 1.0
+
+        faces = None
+        if self.tracking and self._tracked_faces and self._frames_since_full_scan < self.full_scan_interval:
+            faces = self._track_faces(gray, scale)
+            if faces is not None:
+                self.stats["roi_scans"] += 1
+                self._frames_since_full_scan += 1
+        if faces is None:
+            faces = self._cascade_faces(gray, scale, min_size=(30, 30))
+            self.stats["full_scans"] += 1
+            self._frames_since_full_scan = 1
+        if self.tracking:
+            self._tracked_faces = faces
         
         results = []
-        height, width = image.shape[:2]
         
         for (x, y, w, h) in faces:
             roi_gray = gray[y:y+h, x:x+w]
             
-            keypoints = self.detect_facial_features(roi_gray, x, y, w, h, width, height)
+            keypoints = self.detect_facial_features(roi_gray, x, y, w, h, width, height, scale)
             
             detection = Detection(
                 bounding_box=BoundingBox(
@@ -242,61 +317,286 @@ def main():
     cv2.imwrite(output_path, output_image)
     print(f"Annotated image saved to {output_path}")
 
+THUMBNAIL_SHAPE = (32, 32)
+
+def thumbnail_descriptor(face_img: np.ndarray) -> np.ndarray:
+    """Placeholder face descriptor: an equalised, zero-mean, unit-norm 32x32 thumbnail.
+
+    Similar descriptors mean similar-looking crops under similar pose and
+    lighting, not the same person. FaceStorage uses it until a
+    face-recognition embedding is passed as its ``describe``.
+    """
+    if face_img.ndim == 3:
+        face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(face_img, THUMBNAIL_SHAPE[::-1], interpolation=cv2.INTER_AREA)
+    descriptor = cv2.equalizeHist(thumb).astype(np.float32).ravel()
+    descriptor -= descriptor.mean()
+    norm = np.linalg.norm(descriptor)
+    return descriptor / norm if norm > 0 else descriptor
+
+class FaceEmbeddingIndex:
+    """In-memory nearest-neighbour index over face descriptors.
+
+    Descriptors are kept as rows of one contiguous, L2-normalised float32
+    matrix, so cosine similarity against every enrolled face is a single
+    matrix-vector product. The descriptor length is taken from the first
+    face added. Capacity doubles as faces are added, and deletes compact the
+    matrix in place.
+    """
+    def __init__(self, capacity: int = 1024):
+        self._matrix = np.zeros((capacity, 0), dtype=np.float32)
+        self._face_ids = np.zeros(capacity, dtype=np.int64)
+        self._student_ids = np.empty(capacity, dtype=object)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, needed: int):
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        face_ids = np.zeros(capacity, dtype=np.int64)
+        face_ids[:self._size] = self._face_ids[:self._size]
+        student_ids = np.empty(capacity, dtype=object)
+        student_ids[:self._size] = self._student_ids[:self._size]
+        self._matrix, self._face_ids, self._student_ids = matrix, face_ids, student_ids
+
+    def add(self, face_id: int, student_id: str, descriptor: np.ndarray):
+        if self._size == 0 and self._matrix.shape[1] != len(descriptor):
+            self._matrix = np.zeros((len(self._matrix), len(descriptor)), dtype=np.float32)
+        elif len(descriptor) != self._matrix.shape[1]:
+            raise ValueError(f"Descriptor has {len(descriptor)} values, the index holds {self._matrix.shape[1]}")
+        self._grow(self._size + 1)
+        self._matrix[self._size] = descriptor
+        self._face_ids[self._size] = face_id
+        self._student_ids[self._size] = str(student_id)
+        self._size += 1
+
+    def remove_student(self, student_id: str) -> int:
+        """Drop every face of student_id, returning how many were removed"""
+        keep = self._student_ids[:self._size] != str(student_id)
+        kept = int(keep.sum())
+        removed = self._size - kept
+        if removed:
+            self._matrix[:kept] = self._matrix[:self._size][keep]
+            self._face_ids[:kept] = self._face_ids[:self._size][keep]
+            self._student_ids[:kept] = self._student_ids[:self._size][keep]
+            self._student_ids[kept:self._size] = None
+            self._size = kept
+        return removed
+
+    def search(self, descriptor: np.ndarray, k: int = 5) -> List[dict]:
+        """The k most similar enrolled faces (at most all of them), best first"""
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        if self._size == 0:
+            return []
+        scores = self._matrix[:self._size] @ descriptor.astype(np.float32, copy=False)
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{
+            "student_id": self._student_ids[i],
+            "face_id": int(self._face_ids[i]),
+            "similarity": float(scores[i])
+        } for i in top]
+
 class FaceStorage:
-    def __init__(self, database_path: str = "face_database.json"):
+    """Face crops per student in SQLite, indexed by student_id.
+
+    Crops are stored as raw JPEG BLOBs rather than base64 inside one JSON
+    document. Opening the store does not read any faces, and lookups only
+    load the rows of the student asked for. Each row also stores the
+    descriptor that ``describe`` computes for its crop, tagged with
+    ``descriptor_kind``. The FaceEmbeddingIndex used by similar_faces() is
+    built from those descriptors the first time it is needed, re-describing
+    rows of another kind, and then kept in step with store_face and
+    delete_student_data. The default describe is thumbnail_descriptor, a
+    pixel-similarity placeholder; pass a face-recognition embedding and a
+    name for it to match identities. Writes are grouped into
+    transactions of ``commit_every`` faces. Call flush() or close() to commit
+    the last partial batch.
+    """
+    def __init__(self, database_path: str = "face_database.db", commit_every: int = 64,
+                 describe: Callable[[np.ndarray], np.ndarray] = thumbnail_descriptor,
+                 descriptor_kind: str = "thumbnail32"):
         self.database_path = database_path
-        self._load_database()
-    
-    def _load_database(self):
-        if os.path.exists(self.database_path):
-            with open(self.database_path, 'r') as f:
-                self.database = json.load(f)
-        else:
-            self.database = {}
-            
+        self.commit_every = commit_every
+        self.describe = describe
+        self.descriptor_kind = descriptor_kind
+        self._pending = 0
+        self.connection = sqlite3.connect(database_path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS faces (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id TEXT NOT NULL,
+                    image BLOB NOT NULL,
+                    keypoints TEXT NOT NULL,
+                    bbox_x INTEGER NOT NULL,
+                    bbox_y INTEGER NOT NULL,
+                    bbox_width INTEGER NOT NULL,
+                    bbox_height INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    descriptor BLOB,
+                    descriptor_kind TEXT
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS faces_student_id ON faces (student_id)")
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(faces)")]
+            if "descriptor" not in columns:
+                self.connection.execute("ALTER TABLE faces ADD COLUMN descriptor BLOB")
+            if "descriptor_kind" not in columns:
+                self.connection.execute("ALTER TABLE faces ADD COLUMN descriptor_kind TEXT")
+                # Descriptors stored before they were tagged are all thumbnails
+                self.connection.execute(
+                    "UPDATE faces SET descriptor_kind = 'thumbnail32' WHERE descriptor IS NOT NULL")
+        self._embedding_index = None
+
     def save_database(self):
-        with open(self.database_path, 'w') as f:
-            json.dump(self.database, f, indent=4)
+        """Commit faces stored since the last commit."""
+        self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.connection.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self.connection.close()
             
-    def encode_face_region(self, image: np.ndarray, detection: Detection) -> str:
+    @staticmethod
+    def face_region(image: np.ndarray, detection: Detection) -> np.ndarray:
+        """The detected face region of image, as a view"""
         bbox = detection.bounding_box
-        face_img = image[bbox.origin_y:bbox.origin_y + bbox.height,
-                        bbox.origin_x:bbox.origin_x + bbox.width]
-        _, buffer = cv2.imencode('.jpg', face_img)
-        face_encoding = base64.b64encode(buffer).decode('utf-8')
-        return face_encoding
+        return image[bbox.origin_y:bbox.origin_y + bbox.height,
+                     bbox.origin_x:bbox.origin_x + bbox.width]
+
+    def encode_face_region(self, image: np.ndarray, detection: Detection) -> bytes:
+        """JPEG bytes of the detected face region"""
+        _, buffer = cv2.imencode('.jpg', self.face_region(image, detection))
+        return buffer.tobytes()
         
-    def store_face(self, student_id: str, face_encoding: str, detection: Detection):
-        """Store face encoding with student ID and detection data"""
-        if student_id not in self.database:
-            self.database[student_id] = []
+    def store_face(self, student_id: str, face_encoding: Union[bytes, str], detection: Detection,
+                   descriptor: Optional[np.ndarray] = None) -> int:
+        """Store face image with student ID and detection data, returning the face ID
+
+        ``descriptor`` is the crop's describe_face() result when the caller has
+        already computed it; otherwise the JPEG is decoded again to describe it.
+        """
+        if isinstance(face_encoding, str):
+            # Base64 crops from the old JSON database
+            face_encoding = base64.b64decode(face_encoding)
         keypoints_list = [{"x": kp.x, "y": kp.y} for kp in detection.keypoints]
-        face_entry = {
-            "encoding": face_encoding,
-            "keypoints": keypoints_list,
-            "bbox": {
-                "x": detection.bounding_box.origin_x,
-                "y": detection.bounding_box.origin_y,
-                "width": detection.bounding_box.width,
-                "height": detection.bounding_box.height
-            },
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        self.database[student_id].append(face_entry)
-        self.save_database()
+        bbox = detection.bounding_box
+        if descriptor is None:
+            descriptor = self._describe_encoding(face_encoding)
+        cursor = self.connection.execute(
+            "INSERT INTO faces (student_id, image, keypoints, bbox_x, bbox_y, bbox_width, bbox_height, timestamp, "
+            "descriptor, descriptor_kind) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(student_id), sqlite3.Binary(face_encoding), json.dumps(keypoints_list),
+             int(bbox.origin_x), int(bbox.origin_y), int(bbox.width), int(bbox.height),
+             datetime.now().isoformat(),
+             sqlite3.Binary(descriptor.tobytes()) if descriptor is not None else None,
+             self.descriptor_kind if descriptor is not None else None))
+        if self._embedding_index is not None and descriptor is not None:
+            self._embedding_index.add(cursor.lastrowid, student_id, descriptor)
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.flush()
+        return cursor.lastrowid
         
     def get_student_faces(self, student_id: str) -> list:
         """Retrieve all faces for a given student ID"""
-        return self.database.get(student_id, [])
+        rows = self.connection.execute(
+            "SELECT id, image, keypoints, bbox_x, bbox_y, bbox_width, bbox_height, timestamp "
+            "FROM faces WHERE student_id = ? ORDER BY id", (str(student_id),)).fetchall()
+        return [{
+            "id": face_id,
+            "image": bytes(image),
+            "keypoints": json.loads(keypoints),
+            "bbox": {"x": x, "y": y, "width": width, "height": height},
+            "timestamp": timestamp
+        } for face_id, image, keypoints, x, y, width, height, timestamp in rows]
     
     def delete_student_data(self, student_id: str) -> bool:
         """Delete all face data for a given student ID"""
-        if student_id in self.database:
-            del self.database[student_id]
-            self.save_database()
-            return True
-        return False
+        with self.connection:
+            cursor = self.connection.execute("DELETE FROM faces WHERE student_id = ?", (str(student_id),))
+        self._pending = 0
+        if self._embedding_index is not None:
+            self._embedding_index.remove_student(student_id)
+        return cursor.rowcount > 0
+
+    def _describe_encoding(self, face_encoding: bytes) -> Optional[np.ndarray]:
+        face_img = cv2.imdecode(np.frombuffer(face_encoding, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if face_img is None or face_img.size == 0:
+            return None
+        return self.describe_face(face_img)
+
+    def describe_face(self, face_img: np.ndarray) -> np.ndarray:
+        """describe(face_img), L2-normalised since the index ranks by dot product"""
+        descriptor = np.asarray(self.describe(face_img), dtype=np.float32).ravel()
+        norm = np.linalg.norm(descriptor)
+        return descriptor / norm if norm > 0 else descriptor
+
+    @property
+    def embedding_index(self) -> FaceEmbeddingIndex:
+        if self._embedding_index is None:
+            rows = self.connection.execute(
+                "SELECT id, student_id, image, descriptor, descriptor_kind FROM faces ORDER BY id").fetchall()
+            index = FaceEmbeddingIndex(capacity=max(1024, len(rows)))
+            for face_id, student_id, image, descriptor, descriptor_kind in rows:
+                if descriptor is not None and descriptor_kind == self.descriptor_kind:
+                    vector = np.frombuffer(descriptor, dtype=np.float32)
+                else:
+                    # Rows written before descriptors were stored, or by another describe
+                    vector = self._describe_encoding(bytes(image))
+                    if vector is None:
+                        continue
+                    self.connection.execute("UPDATE faces SET descriptor = ?, descriptor_kind = ? WHERE id = ?",
+                                            (sqlite3.Binary(vector.tobytes()), self.descriptor_kind, face_id))
+                    self._pending += 1
+                index.add(face_id, student_id, vector)
+            self.flush()
+            self._embedding_index = index
+        return self._embedding_index
+
+    def similar_faces(self, face_img: np.ndarray, k: int = 5) -> List[dict]:
+        """Enrolled faces whose descriptors are most similar to face_img, best first.
+
+        With the default thumbnail_descriptor this ranks crops by how alike
+        their pixels look, which is not an identity match.
+        """
+        return self.embedding_index.search(self.describe_face(face_img), k)
+
+    def import_json_database(self, json_path: str) -> int:
+        """Import faces from the old base64-in-JSON database file"""
+        with open(json_path, 'r') as f:
+            legacy = json.load(f)
+        count = 0
+        with self.connection:
+            for student_id, faces in legacy.items():
+                for face in faces:
+                    bbox = face["bbox"]
+                    self.connection.execute(
+                        "INSERT INTO faces (student_id, image, keypoints, bbox_x, bbox_y, bbox_width, bbox_height, timestamp) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (str(student_id), sqlite3.Binary(base64.b64decode(face["encoding"])),
+                         json.dumps(face["keypoints"]), bbox["x"], bbox["y"], bbox["width"], bbox["height"],
+                         face.get("timestamp", datetime.now().isoformat())))
+                    count += 1
+        self._pending = 0
+        # Imported rows have no descriptors yet; rebuild the index on next use
+        self._embedding_index = None
+        return count
+
 def main_with_storage():
     face_detector = FaceDetector()
     face_storage = FaceStorage()
@@ -316,6 +616,7 @@ def main_with_storage():
         
             face_encoding = face_storage.encode_face_region(image, detection)
             face_storage.store_face(student_id, face_encoding, detection)
+        face_storage.flush()
         print(f"Successfully stored face data for student ID: {student_id}")
         output_image = DetectionVisualizer.visualize(image, detections)
         cv2.imshow("Detection Results", output_image)
@@ -355,37 +656,99 @@ def load_student_ids(json_path: str) -> List[str]:
         print(f"Error loading student IDs: {str(e)}")
         return []
 
-def process_student_images(student_id: str, image_directory: str, face_detector: FaceDetector, face_storage: FaceStorage) -> None:
-    """Process images for a single student"""
+def _detect_image_faces(image_path: str, face_detector: FaceDetector, face_storage: FaceStorage,
+                        annotated_path: Optional[str]) -> Optional[List[Tuple[bytes, Detection, Optional[np.ndarray]]]]:
+    """Decode, detect, crop and describe one enrollment image. Returns None if the image cannot be read"""
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+
+    image = resize_image(image, target_width=800)
+    detections = face_detector.detect_faces(image)
+    if detections and annotated_path:
+        cv2.imwrite(annotated_path, DetectionVisualizer.visualize(image, detections))
+    faces = []
+    for detection in detections:
+        face_img = face_storage.face_region(image, detection)
+        faces.append((face_storage.encode_face_region(image, detection), detection,
+                      face_storage.describe_face(face_img) if face_img.size else None))
+    return faces
+
+def process_student_images(student_id: str, image_directory: str, face_detector: FaceDetector, face_storage: FaceStorage,
+                           workers: int = 1, save_annotated: bool = True) -> dict:
+    """Process images for a single student
+
+    With workers > 1, images are decoded, detected, cropped and described
+    on a thread pool, so face_storage.describe must be thread safe. OpenCV
+    releases the GIL for that work, and each thread gets its own clone of
+    face_detector because cascade classifiers are not shared safely; their
+    scan counts are added to face_detector.stats at the end. The calling
+    thread is the only writer: it stores faces and their descriptors in file
+    order and leaves commits to the storage's batching.
+    """
+    stats = {"images": 0, "faces": 0, "failed": 0, "seconds": 0.0}
     # Check if directory exists
     if not os.path.exists(image_directory):
         print(f"Error: Image directory {image_directory} not found")
-        return
+        return stats
 
-    # Process all images in directory
-    for image_file in os.listdir(image_directory):
-        if image_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            image_path = os.path.join(image_directory, image_file)
-            image = cv2.imread(image_path)
-            
-            if image is None:
-                print(f"Error: Could not load image from {image_path}")
+    image_files = sorted(f for f in os.listdir(image_directory) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+    start_time = time.perf_counter()
+
+    def annotated_path(image_file):
+        return f"output_{student_id}_{os.path.basename(image_file)}" if save_annotated else None
+
+    thread_detectors = []
+    if workers > 1:
+        local = threading.local()
+
+        def detect(image_file):
+            if not hasattr(local, "face_detector"):
+                local.face_detector = face_detector.clone()
+                thread_detectors.append(local.face_detector)
+            return _detect_image_faces(os.path.join(image_directory, image_file), local.face_detector,
+                                       face_storage, annotated_path(image_file))
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        results = executor.map(detect, image_files)
+    else:
+        executor = None
+        results = (_detect_image_faces(os.path.join(image_directory, image_file), face_detector,
+                                       face_storage, annotated_path(image_file))
+                   for image_file in image_files)
+
+    try:
+        for done, (image_file, faces) in enumerate(zip(image_files, results), start=1):
+            if faces is None:
+                stats["failed"] += 1
+                print(f"Error: Could not load image from {os.path.join(image_directory, image_file)}")
                 continue
 
-            image = resize_image(image, target_width=800)
-            detections = face_detector.detect_faces(image)
-            
-            if detections:
-                for detection in detections:
-                    face_encoding = face_storage.encode_face_region(image, detection)
-                    face_storage.store_face(student_id, face_encoding, detection)
-                
-                output_image = DetectionVisualizer.visualize(image, detections)
-                output_path = f"output_{student_id}_{os.path.basename(image_file)}"
-                cv2.imwrite(output_path, output_image)
-                print(f"Processed and saved {output_path}")
+            stats["images"] += 1
+            for face_encoding, detection, descriptor in faces:
+                face_storage.store_face(student_id, face_encoding, detection, descriptor)
+            stats["faces"] += len(faces)
+
+            if not faces:
+                print(f"[{done}/{len(image_files)}] No faces detected in {image_file}")
+            elif save_annotated:
+                print(f"[{done}/{len(image_files)}] Processed and saved {annotated_path(image_file)}")
             else:
-                print(f"No faces detected in {image_file}")
+                print(f"[{done}/{len(image_files)}] Processed {image_file}")
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for detector in thread_detectors:
+            for key, count in detector.stats.items():
+                face_detector.stats[key] += count
+        face_storage.flush()
+
+    stats["seconds"] = time.perf_counter() - start_time
+    rate = stats["images"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    print(f"Enrolled {stats['faces']} faces from {stats['images']} images for student {student_id} "
+          f"in {stats['seconds']:.2f}s ({rate:.1f} images/s)")
+    return stats
+
 def main_with_storage():
     student_ids_path = "./student_ids.json"
     image_directory = "./sample_1"
@@ -400,7 +763,9 @@ def main_with_storage():
     
     for student_id in student_ids:
         print(f"\nProcessing images for student ID: {student_id}")
-        process_student_images(student_id, image_directory, face_detector, face_storage)
+        process_student_images(student_id, image_directory, face_detector, face_storage,
+                               workers=os.cpu_count() or 1)
+    face_storage.close()
 
 if __name__ == "__main__":
     main_with_storage() 
\ No newline at end of file
@@ -1,28 +1,212 @@
+import sys
+import json
+import logging
 import numpy as np
+import joblib
 from sklearn.ensemble import IsolationForest
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 
 class EnhancedAnomalyDetector:
+    FEATURE_NAMES = [
+        "face_activity_percentage",
+        "body_activity_percentage",
+        "eye_activity_percentage",
+        "blink_rate",
+        "overall_activity_score",
+        "noise_ratio",
+        "voice_match_confidence"
+    ]
+    # (type, feature, comparison, threshold, severity) checked by _detect_suspicious_patterns.
+    # face_activity_percentage is the share of frames with a face, not movement,
+    # so no pattern uses it.
+    SUSPICIOUS_PATTERNS = [
+        ("excessive_body_movement", "body_activity_percentage", ">", 25, "high"),
+        ("high_noise_level", "noise_ratio", ">", 15, "medium"),
+        ("voice_mismatch", "voice_match_confidence", "<", 85, "high")
+    ]
+    # The same, checked by analyze_windows on EnhancedActivityAnalyzer.window_metrics.
+    # Counts assume the default 60 s windows.
+    WINDOW_PATTERNS = [
+        ("sustained_body_movement", "body_activity_percentage", ">", 35, "high"),
+        ("sudden_head_movement", "peak_head_movements", ">", 0.9, "medium"),
+        ("repeated_head_movement", "bursts_head_movements", ">", 5, "high"),
+        ("repeated_mouth_movement", "bursts_mouth_movements", ">", 10, "medium")
+    ]
+    SEVERITY_WEIGHTS = {
+        "low": 0.3,
+        "medium": 0.6,
+        "high": 1.0
+    }
+
     def __init__(self, contamination=0.1):
         self.isolation_forest = IsolationForest(contamination=contamination)
         self.baseline_patterns = None
-        
+
+    @property
+    def is_fitted(self) -> bool:
+        return hasattr(self.isolation_forest, "estimators_")
+
+    @staticmethod
+    def audio_summary(voice_report: Dict) -> Dict:
+        """Audio inputs of the detector from a VoiceProcessor.process_student report.
+
+        noise_ratio is the noise-to-signal amplitude ratio in percent, derived
+        from the validation SNR. The extractor reports an SNR of 0 when it has
+        no noise floor to measure against (a silent floor), so 0 and a missing
+        SNR both count as no measured noise rather than as all noise.
+        voice_match_confidence is the registration comparison confidence in
+        percent; without a registration to compare against there is no
+        evidence of a mismatch, so it is 100.
+        """
+        noise_metrics = ((voice_report.get("validation") or {}).get("features") or {}).get("noise_metrics", {})
+        snr_db = noise_metrics.get("signal_to_noise_ratio")
+        noise_ratio = 100.0 * 10 ** (-snr_db / 20) if snr_db else 0.0
+        comparison = voice_report.get("comparison") or {}
+        confidence = comparison.get("confidence")
+        return {
+            "noise_ratio": round(float(noise_ratio), 2),
+            "voice_match_confidence": round(float(confidence) * 100, 2) if confidence is not None else 100.0
+        }
+
+    def fit(self, feature_matrix: np.ndarray) -> "EnhancedAnomalyDetector":
+        """Fit the isolation forest on rows built by _extract_combined_features"""
+        feature_matrix = np.asarray(feature_matrix, dtype=np.float64)
+        self.isolation_forest.fit(feature_matrix)
+        self.baseline_patterns = {
+            "sessions": int(len(feature_matrix)),
+            "mean": feature_matrix.mean(axis=0).tolist(),
+            "std": feature_matrix.std(axis=0).tolist(),
+            "trained_at": datetime.now().isoformat()
+        }
+        return self
+
+    def fit_sessions(self, sessions: Iterable[Tuple[Dict, Dict]]) -> "EnhancedAnomalyDetector":
+        """Fit on a cohort of historical (activity_data, audio_data) pairs"""
+        return self.fit(np.stack([self._extract_combined_features(activity_data, audio_data)
+                                  for activity_data, audio_data in sessions]))
+
+    def save(self, model_path: str):
+        # Uncompressed, so load() can memory-map the arrays
+        joblib.dump({"isolation_forest": self.isolation_forest,
+                     "baseline_patterns": self.baseline_patterns}, model_path)
+
+    @classmethod
+    def load(cls, model_path: str, mmap_mode: Optional[str] = "r") -> "EnhancedAnomalyDetector":
+        """Load a saved model with its numpy arrays memory-mapped from the file.
+
+        Processes that load the same file share those pages. sklearn still
+        copies the tree node arrays into its own buffers when unpickling.
+        """
+        state = joblib.load(model_path, mmap_mode=mmap_mode)
+        detector = cls()
+        detector.isolation_forest = state["isolation_forest"]
+        detector.baseline_patterns = state["baseline_patterns"]
+        return detector
+
     def analyze_session(self, activity_data: Dict, audio_data: Dict) -> Dict:
         features = self._extract_combined_features(activity_data, audio_data)
-        anomaly_scores = self.isolation_forest.score_samples(features.reshape(1, -1))
-        
+        anomaly_score = None
+        if self.is_fitted:
+            anomaly_score = float(self.isolation_forest.score_samples(features.reshape(1, -1))[0])
+
         suspicious_activities = self._detect_suspicious_patterns(activity_data, audio_data)
         risk_score = self._calculate_risk_score(suspicious_activities)
-        
+
         return {
             "timestamp": datetime.now().isoformat(),
-            "anomaly_score": float(anomaly_scores[0]),
+            "anomaly_score": anomaly_score,
             "risk_score": risk_score,
             "suspicious_activities": suspicious_activities,
             "overall_assessment": self._generate_assessment(risk_score)
         }
-    
+
+    def score_sessions(self, feature_matrix: np.ndarray) -> Dict[str, np.ndarray]:
+        """Score many sessions at once from a matrix of _extract_combined_features rows.
+
+        Returns arrays aligned with the rows: anomaly_score (NaN if the model
+        is not fitted), risk_score, assessment, and a boolean flags matrix
+        with one column per SUSPICIOUS_PATTERNS entry.
+        """
+        feature_matrix = np.atleast_2d(np.asarray(feature_matrix, dtype=np.float64))
+        if self.is_fitted:
+            anomaly_scores = self.isolation_forest.score_samples(feature_matrix)
+        else:
+            anomaly_scores = np.full(len(feature_matrix), np.nan)
+
+        flags, weights = self._pattern_flags(feature_matrix, self.SUSPICIOUS_PATTERNS)
+        risk_scores = self._risk_scores(flags, weights)
+        assessments = np.select(
+            [risk_scores < 20, risk_scores < 50],
+            ["Normal behavior detected", "Some suspicious behavior detected"],
+            "High risk of cheating detected")
+
+        return {
+            "anomaly_score": anomaly_scores,
+            "risk_score": risk_scores,
+            "flags": flags,
+            "assessment": assessments
+        }
+
+    def analyze_windows(self, window_metrics: Dict[str, np.ndarray]) -> List[Dict]:
+        """Time-localized flags from EnhancedActivityAnalyzer.window_metrics.
+
+        Windows are checked against WINDOW_PATTERNS, which look at movement
+        within the window rather than at session-level rates. The isolation
+        forest is not used: it is fitted on whole sessions, and its decision
+        threshold means nothing for a single window. Returns the windows with
+        at least one flagged pattern.
+        """
+        frames = np.asarray(window_metrics["frames"])
+        if len(frames) == 0:
+            return []
+        feature_names = [pattern[1] for pattern in self.WINDOW_PATTERNS]
+        feature_matrix = np.column_stack([np.asarray(window_metrics[name], dtype=np.float64)
+                                          for name in feature_names])
+        flags, weights = self._pattern_flags(feature_matrix, self.WINDOW_PATTERNS, feature_names)
+        risk_scores = self._risk_scores(flags, weights)
+
+        flagged = []
+        for row in np.flatnonzero(flags.any(axis=1) & (frames > 0)):
+            flagged.append({
+                "start_ms": int(window_metrics["start_ms"][row]),
+                "end_ms": int(window_metrics["end_ms"][row]),
+                "frames": int(frames[row]),
+                "risk_score": float(risk_scores[row]),
+                "suspicious_activities": [{
+                    "type": pattern[0],
+                    "severity": pattern[4],
+                    "value": round(float(feature_matrix[row, column]), 2)
+                } for column, (pattern, flag) in enumerate(zip(self.WINDOW_PATTERNS, flags[row])) if flag],
+                "peaks": {key[len("peak_"):]: round(float(values[row]), 4)
+                          for key, values in window_metrics.items() if key.startswith("peak_")},
+                "bursts": {key[len("bursts_"):]: int(values[row])
+                           for key, values in window_metrics.items() if key.startswith("bursts_")}
+            })
+        return flagged
+
+    def _pattern_flags(self, feature_matrix: np.ndarray, patterns: List[Tuple],
+                       feature_names: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Boolean (rows, patterns) matrix of which patterns fire, and each pattern's severity weight.
+
+        feature_names are the columns of feature_matrix (default: FEATURE_NAMES).
+        """
+        feature_names = feature_names or self.FEATURE_NAMES
+        flags = np.empty((len(feature_matrix), len(patterns)), dtype=bool)
+        weights = np.empty(len(patterns))
+        for column, (_, feature, comparison, threshold, severity) in enumerate(patterns):
+            values = feature_matrix[:, feature_names.index(feature)]
+            flags[:, column] = values > threshold if comparison == ">" else values < threshold
+            weights[column] = self.SEVERITY_WEIGHTS[severity]
+        return flags, weights
+
+    @staticmethod
+    def _risk_scores(flags: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        # Same as _calculate_risk_score: mean severity weight of the flagged patterns
+        counts = flags.sum(axis=1)
+        risk_scores = np.divide(flags @ weights, counts, out=np.zeros(len(flags)), where=counts > 0)
+        return np.round(np.minimum(100, risk_scores * 100), 2)
+
     def _extract_combined_features(self, activity_data: Dict, audio_data: Dict) -> np.ndarray:
         return np.array([
             activity_data["face_activity_percentage"],
@@ -33,55 +217,31 @@ class EnhancedAnomalyDetector:
             audio_data["noise_ratio"],
             audio_data["voice_match_confidence"]
         ])
-    
+
     def _detect_suspicious_patterns(self, activity_data: Dict, audio_data: Dict) -> List[Dict]:
         suspicious_patterns = []
-        
-        if activity_data["face_activity_percentage"] > 30:
-            suspicious_patterns.append({
-                "type": "excessive_face_movement",
-                "severity": "high",
-                "value": activity_data["face_activity_percentage"]
-            })
-            
-        if activity_data["body_activity_percentage"] > 25:
-            suspicious_patterns.append({
-                "type": "excessive_body_movement",
-                "severity": "high",
-                "value": activity_data["body_activity_percentage"]
-            })
-            
-        if audio_data["noise_ratio"] > 15:
-            suspicious_patterns.append({
-                "type": "high_noise_level",
-                "severity": "medium",
-                "value": audio_data["noise_ratio"]
-            })
-            
-        if audio_data["voice_match_confidence"] < 85:
-            suspicious_patterns.append({
-                "type": "voice_mismatch",
-                "severity": "high",
-                "value": audio_data["voice_match_confidence"]
-            })
-            
+        values = {**activity_data, **audio_data}
+
+        for pattern_type, feature, comparison, threshold, severity in self.SUSPICIOUS_PATTERNS:
+            value = values[feature]
+            if (value > threshold) if comparison == ">" else (value < threshold):
+                suspicious_patterns.append({
+                    "type": pattern_type,
+                    "severity": severity,
+                    "value": value
+                })
+
         return suspicious_patterns
-    
+
     def _calculate_risk_score(self, suspicious_activities: List[Dict]) -> float:
         if not suspicious_activities:
             return 0.0
-            
-        severity_weights = {
-            "low": 0.3,
-            "medium": 0.6,
-            "high": 1.0
-        }
-        
-        total_weight = sum(severity_weights[activity["severity"]] for activity in suspicious_activities)
+
+        total_weight = sum(self.SEVERITY_WEIGHTS[activity["severity"]] for activity in suspicious_activities)
         normalized_score = min(100, (total_weight / len(suspicious_activities)) * 100)
-        
+
         return round(normalized_score, 2)
-    
+
     def _generate_assessment(self, risk_score: float) -> str:
         if risk_score < 20:
             return "Normal behavior detected"
@@ -90,3 +250,36 @@ class EnhancedAnomalyDetector:
         else:
             return "High risk of cheating detected"
 
+
+def features_from_report(detector: EnhancedAnomalyDetector, report: Dict) -> np.ndarray:
+    """Feature row of a saved ExamMonitor report"""
+    analysis = report["analysis"]
+    return detector._extract_combined_features(analysis["activity_metrics"],
+                                               analysis["audio_analysis"]["audio_features"])
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python -m models.anomlydetect_model.anomaly_detector <model_path> <report.json>...")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    model_path, report_paths = sys.argv[1], sys.argv[2:]
+    detector = EnhancedAnomalyDetector()
+    rows = []
+    for report_path in report_paths:
+        try:
+            with open(report_path, 'r') as f:
+                rows.append(features_from_report(detector, json.load(f)))
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Skipping {report_path}: {e}")
+    if not rows:
+        logging.error("No usable reports to train on")
+        sys.exit(1)
+
+    detector.fit(np.stack(rows)).save(model_path)
+    logging.info(f"Trained on {len(rows)} sessions, model saved to {model_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 import os
 import logging
+import hashlib
 import json
+import shutil
+import subprocess
 import sys
+import threading
+from concurrent.futures import CancelledError
 from datetime import datetime
+from functools import cached_property, lru_cache
+from typing import Dict, Iterable, Iterator, Optional
 import numpy as np
 import librosa
-from pydub import AudioSegment
+import soundfile as sf
+from models.audio_model.feature_store import VoiceFeatureStore
+from models.audio_model.result_store import VoiceResultStore
+from models.instrumentation import StageTimer
 
 def numpy_to_python(obj):
     if isinstance(obj, np.integer):
@@ -18,68 +28,394 @@ def numpy_to_python(obj):
         return bool(obj)
     return obj
 
-class SoundFeatureExtractor:
+@lru_cache(maxsize=None)
+def ffmpeg_available() -> bool:
+    """Probe for ffmpeg/ffprobe once per process; only needed when decoding containers."""
+    available = shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+    if not available:
+        logging.warning("FFmpeg not found. Please install FFmpeg for audio processing.")
+    return available
+
+class SpectralContext:
+    """One STFT of a recording, shared by every spectral metric.
+
+    The metrics used to call librosa with ``y=audio`` and recompute the same
+    2048/512 STFT for each one. They are now derived from this single
+    magnitude spectrogram, and the results are unchanged. Frequency-dependent
+    metrics keep librosa's default 22050 Hz, as the original calls did.
+    """
+    N_FFT = 2048
+    HOP_LENGTH = 512
+    ANALYSIS_SR = 22050
+
+    def __init__(self, audio: np.ndarray):
+        self.audio = audio
+        self.magnitude = np.abs(librosa.stft(audio, n_fft=self.N_FFT, hop_length=self.HOP_LENGTH))
+
+    @cached_property
+    def mel_power(self) -> np.ndarray:
+        return librosa.feature.melspectrogram(S=self.magnitude ** 2, sr=self.ANALYSIS_SR)
+
+def _histogram_percentile(counts: np.ndarray, centers: np.ndarray, q: float) -> np.ndarray:
+    """Percentile q of the values binned in counts (last axis), as bin centers."""
+    cumulative = np.cumsum(counts, axis=-1)
+    target = cumulative[..., -1:] * (q / 100.0)
+    return centers[np.argmax(cumulative >= np.maximum(target, 1), axis=-1)]
+
+def _log_bin_centers(low: float, high: float, per_decade: int) -> np.ndarray:
+    """Representative value of each bin produced by _log_bin_index.
+
+    Bin 0 holds values below ``low`` (including exact zeros) and is represented
+    by 0; the last bin holds values at or above ``high``.
+    """
+    edges = np.logspace(np.log10(low), np.log10(high), int(round(np.log10(high / low) * per_decade)) + 1)
+    return np.concatenate(([0.0], np.sqrt(edges[:-1] * edges[1:]), [edges[-1]]))
+
+def _log_bin_index(values: np.ndarray, low: float, per_decade: int, n_bins: int) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        index = np.floor((np.log10(values) - np.log10(low)) * per_decade) + 1
+    return np.clip(index, 0, n_bins - 1).astype(np.intp)
+
+class StreamingVoiceStats:
+    """Running estimators for the voice and noise metrics over audio blocks.
+
+    Memory is fixed by the histogram sizes, whatever the recording length.
+    Compared with the in-memory path:
+
+    * strength, clarity and pitch_stability differ only by the first two STFT
+      frames (about 1e-3 relative for a few minutes of audio). The streamed
+      STFT is zero padded by half a window at the end, as librosa's centred
+      STFT is, but not at the start. A recording shorter than one block,
+      including one shorter than a single window, is centre padded at both
+      ends and gets the same frames as the in-memory path.
+    * background_level and signal_to_noise_ratio use percentiles read from
+      log-spaced histograms with 100 bins per decade. Each percentile is
+      within about 1.2% of the exact value, which is about 0.2 dB of SNR.
+    * disturbance_level applies the 80 dB floor of power_to_db against the
+      running maximum rather than the global one. Once the loudest passage
+      has been seen, the two agree.
+    """
+    PER_DECADE = 100
+    MAGNITUDE_LOW = 1e-8
+    AMPLITUDE_LOW = 1e-7
+    TOP_DB = 80.0
+
     def __init__(self):
+        n_bins = 1 + SpectralContext.N_FFT // 2
+        self.magnitude_centers = _log_bin_centers(self.MAGNITUDE_LOW, 1e4, self.PER_DECADE)
+        self.amplitude_centers = _log_bin_centers(self.AMPLITUDE_LOW, 1.0, self.PER_DECADE)
+        n_magnitude = len(self.magnitude_centers)
+
+        self.frames = 0
+        self.mel_sum = 0.0
+        self.mel_count = 0
+        self.contrast_sum = 0.0
+        self.contrast_count = 0
+        self.onset_sum = 0.0
+        self.db_max = -np.inf
+        self.prev_db: Optional[np.ndarray] = None
+        self.magnitude_hist = np.zeros((n_bins, n_magnitude), dtype=np.int64)
+        self.pitch_count = np.zeros(n_magnitude, dtype=np.int64)
+        self.pitch_sum = np.zeros(n_magnitude, dtype=np.float64)
+        self.pitch_sumsq = np.zeros(n_magnitude, dtype=np.float64)
+        self.amplitude_hist = np.zeros(len(self.amplitude_centers), dtype=np.int64)
+
+    def update_samples(self, samples: np.ndarray):
+        """Add samples that have not been seen before (SNR statistics)."""
+        index = _log_bin_index(np.abs(samples), self.AMPLITUDE_LOW, self.PER_DECADE,
+                               len(self.amplitude_hist))
+        self.amplitude_hist += np.bincount(index, minlength=len(self.amplitude_hist))
+
+    def update_spectrum(self, magnitude: np.ndarray):
+        """Add consecutive STFT magnitude frames (n_fft=2048, hop=512)."""
+        sr = SpectralContext.ANALYSIS_SR
+        n_bins, n_frames = magnitude.shape
+        n_magnitude = self.magnitude_hist.shape[1]
+        self.frames += n_frames
+
+        index = _log_bin_index(magnitude, self.MAGNITUDE_LOW, self.PER_DECADE, n_magnitude)
+        index += np.arange(n_bins)[:, None] * n_magnitude
+        self.magnitude_hist += np.bincount(index.ravel(), minlength=self.magnitude_hist.size).reshape(
+            self.magnitude_hist.shape)
+
+        mel = librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr)
+        self.mel_sum += float(mel.sum(dtype=np.float64))
+        self.mel_count += mel.size
+
+        db = 10.0 * np.log10(np.maximum(1e-10, mel))
+        self.db_max = max(self.db_max, float(db.max()))
+        db = np.maximum(db, self.db_max - self.TOP_DB)
+        if self.prev_db is not None:
+            db_with_prev = np.concatenate((self.prev_db, db), axis=1)
+        else:
+            db_with_prev = db
+        self.onset_sum += float(np.maximum(0.0, np.diff(db_with_prev, axis=1)).mean(axis=0).sum())
+        self.prev_db = db[:, -1:]
+
+        contrast = librosa.feature.spectral_contrast(S=magnitude, sr=sr)
+        self.contrast_sum += float(contrast.sum(dtype=np.float64))
+        self.contrast_count += contrast.size
+
+        pitches, magnitudes = librosa.piptrack(S=magnitude, sr=sr)
+        index = _log_bin_index(magnitudes.ravel(), self.MAGNITUDE_LOW, self.PER_DECADE, n_magnitude)
+        pitches = pitches.ravel().astype(np.float64)
+        self.pitch_count += np.bincount(index, minlength=n_magnitude)
+        self.pitch_sum += np.bincount(index, weights=pitches, minlength=n_magnitude)
+        self.pitch_sumsq += np.bincount(index, weights=pitches ** 2, minlength=n_magnitude)
+
+    def _pitch_stability(self) -> float:
+        # Pitches whose piptrack magnitude is above the median magnitude
+        cumulative = np.cumsum(self.pitch_count)
+        median_bin = int(np.argmax(cumulative >= max(cumulative[-1] / 2.0, 1)))
+        count = self.pitch_count[median_bin + 1:].sum()
+        if count == 0:
+            return float("nan")
+        mean = self.pitch_sum[median_bin + 1:].sum() / count
+        return float(np.sqrt(max(0.0, self.pitch_sumsq[median_bin + 1:].sum() / count - mean ** 2)))
+
+    def features(self) -> Dict:
+        if self.frames == 0:
+            raise ValueError("Audio is too short for spectral analysis")
+
+        noise_floor = float(_histogram_percentile(self.amplitude_hist, self.amplitude_centers, 10))
+        signal = float(_histogram_percentile(self.amplitude_hist, self.amplitude_centers, 90))
+        background = _histogram_percentile(self.magnitude_hist, self.magnitude_centers, 10)
+
+        return {
+            "voice_metrics": {
+                "strength": self.mel_sum / self.mel_count,
+                "clarity": self.contrast_sum / self.contrast_count,
+                "pitch_stability": self._pitch_stability()
+            },
+            "noise_metrics": {
+                "background_level": float(np.mean(background)),
+                "signal_to_noise_ratio": 20 * np.log10(signal / noise_floor) if noise_floor > 0 else 0,
+                "disturbance_level": self.onset_sum / self.frames
+            }
+        }
+
+class SoundFeatureExtractor:
+    CHUNK_SAMPLES = 1 << 18
+    # Bump when a change to feature extraction alters its output, so cached
+    # features computed by older code are no longer reused.
+    FEATURE_VERSION = "2"
+
+    def __init__(self, streaming: bool = False, block_frames: int = 1024,
+                 decode_cache_dir: Optional[str] = None, timer: Optional[StageTimer] = None):
         self.supported_formats = [".wav", ".mp3", ".flac", ".ogg", ".mp4"]
-        self._check_ffmpeg()
+        # Streaming reads block_frames STFT frames (~24 s at 22.05 kHz) at a time
+        # instead of loading the whole recording; see StreamingVoiceStats.
+        self.streaming = streaming
+        self.block_frames = block_frames
+        # Decoded container audio is cached here by content hash when set
+        self.decode_cache_dir = decode_cache_dir
+        self.timer = timer or StageTimer(enabled=False)
     
-    def _check_ffmpeg(self):
-        try:
-            AudioSegment.from_file(os.devnull)
-        except Exception as e:
-            if "ffprobe" in str(e):
-                logging.warning("FFmpeg not found. Please install FFmpeg for audio processing.")
+    @property
+    def version(self) -> str:
+        return f"{self.FEATURE_VERSION}-{'streaming' if self.streaming else 'memory'}"
+
+    def _check_ffmpeg(self) -> bool:
+        return ffmpeg_available()
+
+    def _check_cancelled(self, cancelled: Optional[threading.Event]):
+        if cancelled is not None and cancelled.is_set():
+            raise CancelledError("Audio analysis cancelled")
 
-    def extract_voice_features(self, audio_path):
+    def extract_voice_features(self, audio_path, cancelled: Optional[threading.Event] = None,
+                               decoded_chunks: Optional[Iterable[np.ndarray]] = None):
+        """Voice and noise metrics of a recording.
+
+        decoded_chunks, if given, is the recording already decoded to mono
+        float32 at ANALYSIS_SR (e.g. MediaDemuxer.audio_chunks()), and
+        audio_path is not decoded again. Once ``cancelled`` is set, raises
+        CancelledError at the next stage boundary, or at the next chunk when
+        streaming.
+        """
         try:
             if not os.path.exists(audio_path):
                 raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
             _, ext = os.path.splitext(audio_path)
-            if ext.lower() == ".mp4":
-                audio_path = self._convert_to_wav(audio_path)            
-            audio, sr = librosa.load(audio_path, sr=None)                        
-            voice_strength = self._calculate_voice_strength(audio)
-            background_noise = self._calculate_background_noise(audio)
-            disturbance = self._calculate_disturbance(audio)
-
-            features = {
-                "voice_metrics": {
-                    "strength": numpy_to_python(voice_strength),
-                    "clarity": numpy_to_python(self._calculate_voice_clarity(audio)),
-                    "pitch_stability": numpy_to_python(self._calculate_pitch_stability(audio))
-                },
-                "noise_metrics": {
-                    "background_level": numpy_to_python(background_noise),
-                    "signal_to_noise_ratio": numpy_to_python(self._calculate_snr(audio)),
-                    "disturbance_level": numpy_to_python(disturbance)
+            if decoded_chunks is not None:
+                chunks = decoded_chunks
+            elif ext.lower() == ".mp4":
+                chunks = self._decoded_chunks(audio_path)
+            elif self.streaming:
+                chunks = self._file_chunks(audio_path)
+            else:
+                chunks = None
+
+            if self.streaming:
+                return self._extract_voice_features_streaming(self.timer.timed_iter("audio.decode", chunks, len),
+                                                              cancelled)
+
+            with self.timer.stage("audio.decode") as stage:
+                if chunks is not None:
+                    audio = np.concatenate(list(chunks) or [np.zeros(0, dtype=np.float32)])
+                else:
+                    audio, sr = librosa.load(audio_path, sr=None)
+                if stage is not None:
+                    # Items are decoded samples, as for the streaming path
+                    stage.items = len(audio)
+            self._check_cancelled(cancelled)
+            with self.timer.stage("audio.stft"):
+                spec = SpectralContext(audio)
+            self._check_cancelled(cancelled)
+
+            with self.timer.stage("audio.metrics"):
+                features = {
+                    "voice_metrics": {
+                        "strength": numpy_to_python(self._calculate_voice_strength(spec)),
+                        "clarity": numpy_to_python(self._calculate_voice_clarity(spec)),
+                        "pitch_stability": numpy_to_python(self._calculate_pitch_stability(spec))
+                    },
+                    "noise_metrics": {
+                        "background_level": numpy_to_python(self._calculate_background_noise(spec)),
+                        "signal_to_noise_ratio": numpy_to_python(self._calculate_snr(audio)),
+                        "disturbance_level": numpy_to_python(self._calculate_disturbance(spec))
+                    }
                 }
-            }
             return features
 
         except Exception as e:
             logging.error(f"Error extracting features from {audio_path}: {str(e)}")
             raise
 
-    def _calculate_voice_strength(self, audio):                
-        voice_mask = librosa.feature.melspectrogram(y=audio, sr=22050)
-        return np.mean(voice_mask)
+    def _file_chunks(self, audio_path) -> Iterator[np.ndarray]:
+        for block in sf.blocks(audio_path, blocksize=self.CHUNK_SAMPLES, dtype="float32", always_2d=True):
+            yield block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+    def _ffmpeg_chunks(self, input_path) -> Iterator[np.ndarray]:
+        """Decode the audio track straight from ffmpeg's stdout as mono float32 at ANALYSIS_SR."""
+        if not self._check_ffmpeg():
+            raise RuntimeError(f"FFmpeg is required to decode {input_path}")
+
+        command = ["ffmpeg", "-nostdin", "-v", "error", "-i", input_path, "-vn", "-ac", "1",
+                   "-ar", str(SpectralContext.ANALYSIS_SR), "-f", "f32le", "pipe:1"]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        errors = []
+
+        # Drain stderr while stdout is read: ffmpeg blocks once the stderr pipe
+        # fills up, e.g. on a recording with many corrupt packets
+        def read_stderr():
+            with process.stderr:
+                errors.append(process.stderr.read())
+
+        stderr_reader = threading.Thread(target=read_stderr, name="ffmpeg-stderr", daemon=True)
+        stderr_reader.start()
+        try:
+            while True:
+                data = process.stdout.read(self.CHUNK_SAMPLES * 4)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+            stderr_reader.join()
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed to decode {input_path}: "
+                                   f"{b''.join(errors).decode(errors='replace').strip()}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            stderr_reader.join()
+            process.stdout.close()
+
+    def _decode_cache_path(self, input_path) -> str:
+        digest = hashlib.sha256()
+        with open(input_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return os.path.join(self.decode_cache_dir,
+                            f"{digest.hexdigest()}_{SpectralContext.ANALYSIS_SR}.f32")
+
+    def _decoded_chunks(self, input_path) -> Iterator[np.ndarray]:
+        """Decoded container audio, read from or written to the decode cache when enabled."""
+        if not self.decode_cache_dir:
+            yield from self._ffmpeg_chunks(input_path)
+            return
+
+        cache_path = self._decode_cache_path(input_path)
+        if os.path.exists(cache_path):
+            if os.path.getsize(cache_path) == 0:
+                return
+            audio = np.memmap(cache_path, dtype=np.float32, mode="r")
+            for start in range(0, len(audio), self.CHUNK_SAMPLES):
+                yield np.asarray(audio[start:start + self.CHUNK_SAMPLES])
+            return
+
+        os.makedirs(self.decode_cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in self._ffmpeg_chunks(input_path):
+                    f.write(chunk.tobytes())
+                    yield chunk
+            os.replace(temp_path, cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _extract_voice_features_streaming(self, chunks: Iterator[np.ndarray],
+                                          cancelled: Optional[threading.Event] = None):
+        n_fft, hop_length = SpectralContext.N_FFT, SpectralContext.HOP_LENGTH
+        # Consecutive blocks overlap by n_fft - hop so their STFT frames tile the stream exactly
+        overlap = n_fft - hop_length
+        blocksize = (self.block_frames - 1) * hop_length + n_fft
+        stats = StreamingVoiceStats()
 
-    def _calculate_background_noise(self, audio):                
-        S = np.abs(librosa.stft(audio))
-        percentile = np.percentile(S, 10, axis=1)
+        buffer = np.zeros(0, dtype=np.float32)
+        for chunk in chunks:
+            self._check_cancelled(cancelled)
+            stats.update_samples(chunk)
+            buffer = np.concatenate((buffer, chunk))
+            while len(buffer) >= blocksize:
+                self._update_spectrum(stats, buffer[:blocksize])
+                buffer = buffer[blocksize - overlap:]
+        if stats.frames == 0:
+            # The whole recording fits in one block, possibly in less than one
+            # window: centre pad it as the in-memory STFT does
+            if len(buffer):
+                self._update_spectrum(stats, buffer, center=True)
+        elif len(buffer) > overlap:
+            # Samples after the last full window still get frames, as with the
+            # half-window zero padding at the end of librosa.stft(center=True)
+            self._update_spectrum(stats, np.concatenate((buffer, np.zeros(n_fft // 2, dtype=np.float32))))
+
+        features = stats.features()
+        return {
+            group: {name: numpy_to_python(value) for name, value in metrics.items()}
+            for group, metrics in features.items()
+        }
+
+    def _update_spectrum(self, stats: "StreamingVoiceStats", block: np.ndarray, center: bool = False):
+        with self.timer.stage("audio.stft", items=1):
+            magnitude = self._block_magnitude(block, center)
+        with self.timer.stage("audio.metrics", items=1):
+            stats.update_spectrum(magnitude)
+
+    def _block_magnitude(self, block: np.ndarray, center: bool = False) -> np.ndarray:
+        return np.abs(librosa.stft(block, n_fft=SpectralContext.N_FFT,
+                                   hop_length=SpectralContext.HOP_LENGTH, center=center))
+
+    def _calculate_voice_strength(self, spec: SpectralContext):
+        return np.mean(spec.mel_power)
+
+    def _calculate_background_noise(self, spec: SpectralContext):
+        percentile = np.percentile(spec.magnitude, 10, axis=1)
         return np.mean(percentile)
 
-    def _calculate_disturbance(self, audio):                
-        onset_env = librosa.onset.onset_strength(y=audio)
+    def _calculate_disturbance(self, spec: SpectralContext):
+        onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(spec.mel_power),
+                                                 sr=spec.ANALYSIS_SR)
         return np.mean(onset_env)
 
-    def _calculate_voice_clarity(self, audio):        
-        contrast = librosa.feature.spectral_contrast(y=audio)
+    def _calculate_voice_clarity(self, spec: SpectralContext):
+        contrast = librosa.feature.spectral_contrast(S=spec.magnitude, sr=spec.ANALYSIS_SR)
         return np.mean(contrast)
 
-    def _calculate_pitch_stability(self, audio):        
-        pitches, magnitudes = librosa.piptrack(y=audio)
+    def _calculate_pitch_stability(self, spec: SpectralContext):
+        pitches, magnitudes = librosa.piptrack(S=spec.magnitude, sr=spec.ANALYSIS_SR)
         return np.std(pitches[magnitudes > np.median(magnitudes)])
 
     def _calculate_snr(self, audio):        
@@ -87,17 +423,6 @@ class SoundFeatureExtractor:
         signal = np.percentile(np.abs(audio), 90)
         return 20 * np.log10(signal / noise_floor) if noise_floor > 0 else 0
 
-    def _convert_to_wav(self, input_path):
-        output_path = f"{os.path.splitext(input_path)[0]}.wav"
-        try:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            audio = AudioSegment.from_file(input_path)
-            audio.export(output_path, format="wav")
-            return output_path
-        except Exception as e:
-            logging.error(f"Error converting audio to WAV: {str(e)}")
-            raise
-
     def compare_voices(self, features1, features2, threshold=0.85):
         try:
             if not features1 or not features2:
@@ -125,12 +450,25 @@ class SoundFeatureExtractor:
             return {"match": False, "confidence": 0, "error": str(e)}
 
 class VoiceProcessor:
-    def __init__(self, config_path="C:/Users/Admin/Desktop/aiml_v2/models/audio_model/student_id.json"):
+    def __init__(self, config_path="C:/Users/Admin/Desktop/aiml_v2/models/audio_model/student_id.json",
+                 streaming: bool = False, feature_store_path: Optional[str] = None,
+                 cache_features: bool = True, results_db_path: Optional[str] = None,
+                 export_json: bool = False, timer: Optional[StageTimer] = None):
         self.config_path = config_path
         self.load_config()
-        self.feature_extractor = SoundFeatureExtractor()
+        self.feature_extractor = SoundFeatureExtractor(streaming=streaming, timer=timer)
         self.output_dir = os.path.dirname(config_path)
-        
+        # Registration recordings rarely change, so their features are cached across sessions
+        self.feature_store = None
+        if cache_features:
+            self.feature_store = VoiceFeatureStore(
+                feature_store_path or os.path.join(self.output_dir, "voice_features.db"))
+        # Results are upserted per student; the config JSON is only rewritten on export
+        self.export_json = export_json
+        self.result_store = VoiceResultStore(results_db_path or os.path.join(self.output_dir, "voice_results.db"))
+        if self.config_data["results"]:
+            self.result_store.import_missing(self.config_data["results"], default=numpy_to_python)
+
     def load_config(self):
         if not os.path.exists(self.config_path):
             raise FileNotFoundError(f"Config file not found: {self.config_path}")
@@ -140,7 +478,8 @@ class VoiceProcessor:
             
         self.config_data.setdefault("results", {})
 
-    def process_student(self, student_id, student_data):
+    def process_student(self, student_id, student_data, cancelled: Optional[threading.Event] = None,
+                        validate_chunks: Optional[Iterable[np.ndarray]] = None):
         logging.info(f"Processing student: {student_id}")
         
         report = {
@@ -160,13 +499,14 @@ class VoiceProcessor:
                 if not register_path or not os.path.exists(register_path):
                     raise FileNotFoundError(f"Registration audio file not found: {register_path}")
                 
-                register_features = self.feature_extractor.extract_voice_features(register_path)
+                register_features, cached = self._registration_features(register_path)
                 if register_features is None:
                     raise ValueError(f"Failed to extract features from registration audio: {register_path}")
                 
                 report["registration"] = {
                     "audio_path": register_path,
                     "features": register_features,
+                    "cached": cached,
                     "processed_at": datetime.now().isoformat()
                 }
 
@@ -175,7 +515,8 @@ class VoiceProcessor:
                 if not validate_path or not os.path.exists(validate_path):
                     raise FileNotFoundError(f"Validation audio file not found: {validate_path}")
                 
-                validate_features = self.feature_extractor.extract_voice_features(validate_path)
+                validate_features = self.feature_extractor.extract_voice_features(validate_path, cancelled,
+                                                                                  validate_chunks)
                 if validate_features is None:
                     raise ValueError(f"Failed to extract features from validation audio: {validate_path}")
                 
@@ -195,21 +536,51 @@ class VoiceProcessor:
                         "compared_at": datetime.now().isoformat()
                     }
 
-            self.config_data["results"][student_id] = report
-            self._save_config()
+            self.result_store.upsert(student_id, report, default=numpy_to_python)
             return report
             
         except Exception as e:
             logging.error(f"Error processing student {student_id}: {str(e)}")
             report["error"] = str(e)
-            self.config_data["results"][student_id] = report
-            self._save_config()
+            self.result_store.upsert(student_id, report, default=numpy_to_python)
             raise
 
-    def _save_config(self):
-        with open(self.config_path, 'w') as f:
-            json.dump(self.config_data, f, indent=4, default=numpy_to_python)
-        logging.info(f"Updated results in: {self.config_path}")
+    def _registration_features(self, register_path):
+        """Registration features from the feature store, extracting them on a miss."""
+        if self.feature_store is None:
+            return self.feature_extractor.extract_voice_features(register_path), False
+
+        content_key = self.feature_store.content_key(register_path)
+        features = self.feature_store.get(content_key, self.feature_extractor.version)
+        if features is not None:
+            logging.info(f"Using cached registration features for: {register_path}")
+            return features, True
+
+        features = self.feature_extractor.extract_voice_features(register_path)
+        if features is not None:
+            self.feature_store.put(content_key, self.feature_extractor.version, features)
+        return features, False
+
+    def flush(self):
+        """Commit any results still pending in the current batch."""
+        self.result_store.flush()
+
+    def export_results(self, export_path: Optional[str] = None):
+        """Write the config with every stored result to a JSON file (the config by default)."""
+        export_path = export_path or self.config_path
+        self.flush()
+        exported = {**self.config_data, "results": self.result_store.all()}
+        with open(export_path, 'w') as f:
+            json.dump(exported, f, indent=4, default=numpy_to_python)
+        logging.info(f"Exported results to: {export_path}")
+
+    def close(self):
+        self.flush()
+        if self.export_json:
+            self.export_results()
+        self.result_store.close()
+        if self.feature_store is not None:
+            self.feature_store.close()
 
 def setup_logging():
     logging.basicConfig(
@@ -222,7 +593,7 @@ def main():
     logging.info("Starting voice verification processing")
     
     try:
-        processor = VoiceProcessor()
+        processor = VoiceProcessor(export_json=True)
         students = processor.config_data.get("students", {})
         
         if not students:
@@ -238,6 +609,7 @@ def main():
             except Exception as e:
                 logging.error(f"Failed to process student {student_id}: {str(e)}")
                 
+        processor.close()
         logging.info("Processing completed")
         return 0
         
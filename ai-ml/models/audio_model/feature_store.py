@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class VoiceFeatureStore:
+    """SQLite cache of extracted voice features.
+
+    Entries are keyed by the SHA-256 of the audio file and the extractor
+    version, so a re-uploaded or moved recording still hits the cache. The
+    cache misses when the file changes or when the extraction code changes.
+    Each path is also indexed by (mtime, size), so an unchanged file is
+    looked up without hashing it again.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # WAL lets other processes read while one is writing
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS voice_features (
+                    content_hash TEXT NOT NULL,
+                    extractor_version TEXT NOT NULL,
+                    features TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (content_hash, extractor_version)
+                )""")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS audio_files (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL
+                )""")
+
+    def content_key(self, audio_path: str) -> str:
+        """Content hash of audio_path, reusing the stored hash if the file is unchanged."""
+        path = os.path.abspath(audio_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT content_hash FROM audio_files WHERE path = ? AND mtime_ns = ? AND size = ?",
+                (path, stat.st_mtime_ns, stat.st_size)).fetchone()
+        if row:
+            return row[0]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO audio_files (path, mtime_ns, size, content_hash) VALUES (?, ?, ?, ?)",
+                (path, stat.st_mtime_ns, stat.st_size, content_hash))
+        return content_hash
+
+    def get(self, content_hash: str, extractor_version: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT features FROM voice_features WHERE content_hash = ? AND extractor_version = ?",
+                (content_hash, extractor_version)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, content_hash: str, extractor_version: str, features: Dict):
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO voice_features (content_hash, extractor_version, features, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (content_hash, extractor_version, json.dumps(features), datetime.now().isoformat()))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,92 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+
+class VoiceResultStore:
+    """SQLite store of per-student voice verification reports.
+
+    Each report is upserted as its own row, so recording one student costs
+    the size of that report rather than a rewrite of every result. Reports
+    are held in memory and written in one short transaction per batch of
+    ``commit_every`` rows, or by a timer ``max_commit_delay`` seconds after
+    the first unwritten one, whichever comes first. No write transaction is
+    left open between batches, so other processes sharing the database only
+    wait for the batch itself. The database runs in WAL mode, so readers are
+    not blocked even then.
+    """
+
+    def __init__(self, db_path: str, commit_every: int = 32, max_commit_delay: float = 5.0):
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self.max_commit_delay = max_commit_delay
+        # student_id -> (report json, updated_at), not yet written
+        self._pending: Dict[str, Tuple[str, str]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS voice_results (
+                    student_id TEXT PRIMARY KEY,
+                    report TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )""")
+
+    def upsert(self, student_id: str, report: Dict, default=None):
+        with self._lock:
+            self._pending[str(student_id)] = (json.dumps(report, default=default), datetime.now().isoformat())
+            if len(self._pending) >= self.commit_every:
+                self._commit()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_commit_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def import_missing(self, results: Dict[str, Dict], default=None):
+        """Seed the store from a legacy results mapping without overwriting newer rows."""
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO voice_results (student_id, report, updated_at) VALUES (?, ?, ?)",
+                [(str(student_id), json.dumps(report, default=default), datetime.now().isoformat())
+                 for student_id, report in results.items()])
+
+    def get(self, student_id: str) -> Optional[Dict]:
+        with self._lock:
+            if str(student_id) in self._pending:
+                return json.loads(self._pending[str(student_id)][0])
+            row = self.connection.execute(
+                "SELECT report FROM voice_results WHERE student_id = ?", (str(student_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT student_id, report FROM voice_results ORDER BY student_id").fetchall()
+            rows = dict(rows)
+            rows.update((student_id, report) for student_id, (report, _) in self._pending.items())
+        return {student_id: json.loads(rows[student_id]) for student_id in sorted(rows)}
+
+    def _commit(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO voice_results (student_id, report, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(student_id) DO UPDATE SET report = excluded.report, updated_at = excluded.updated_at",
+                [(student_id, report, updated_at) for student_id, (report, updated_at) in self._pending.items()])
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
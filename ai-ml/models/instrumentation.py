@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "items", "start")
+
+    def __init__(self, timer: "StageTimer", name: str, items: int):
+        self.timer = timer
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.start, 1, self.items)
+        return False
+
+
+class StageTimer:
+    """Wall time, call count and item count (e.g. frames) per named pipeline stage.
+
+    Stages are timed with ``with timer.stage("video.face_mesh", items=1):``.
+    A disabled timer returns one shared no-op context manager, and its
+    timed_iter hands back the iterable unchanged. Instrumented code then costs
+    a method call per stage and no clock reads. Updates take a lock, so
+    stages can be timed from a decoder thread and the main thread at once.
+    """
+    _DISABLED = nullcontext()
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._stages: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, items: int = 0):
+        if not self.enabled:
+            return self._DISABLED
+        return _Stage(self, name, items)
+
+    def timed_iter(self, name: str, iterable: Iterable, size: Optional[Callable] = None) -> Iterator:
+        """Charge the time spent producing each item of iterable to stage name.
+
+        Each item counts as size(item) items (e.g. len for sample chunks), or 1.
+        """
+        if not self.enabled:
+            return iter(iterable)
+        return self._timed_iter(name, iter(iterable), size)
+
+    def _timed_iter(self, name: str, iterator: Iterator, size: Optional[Callable]) -> Iterator:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start, 0, 0)
+                return
+            self.add(name, time.perf_counter() - start, 1, size(item) if size else 1)
+            yield item
+
+    def add(self, name: str, seconds: float, calls: int = 1, items: int = 0):
+        with self._lock:
+            entry = self._stages.get(name)
+            if entry is None:
+                entry = self._stages[name] = [0.0, 0, 0]
+            entry[0] += seconds
+            entry[1] += calls
+            entry[2] += items
+
+    def merge(self, summary: Dict[str, Dict]):
+        """Add the stages of another timer's summary(), e.g. from a worker process."""
+        for name, stage in summary.items():
+            self.add(name, stage["seconds"], stage["calls"], stage["items"])
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {"seconds": round(seconds, 6), "calls": calls, "items": items}
+                for name, (seconds, calls, items) in self._stages.items()
+            }
+
+    def write_prometheus(self, path: str, prefix: str = "exam_monitor", labels: Optional[Dict[str, str]] = None):
+        """Write the stages as counters in the Prometheus textfile-collector format.
+
+        The file is replaced atomically, so the collector never reads a
+        partial write. Values are whatever this timer has accumulated, so
+        give it a timer that is not reset between sessions.
+        """
+        extra = "".join(f',{key}="{value}"' for key, value in (labels or {}).items())
+        metrics = [
+            ("stage_seconds_total", "Wall time spent in each pipeline stage.", 0),
+            ("stage_calls_total", "Number of times each pipeline stage ran.", 1),
+            ("stage_items_total", "Items (frames, audio samples) processed by each pipeline stage.", 2)
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+        lines = []
+        for metric, help_text, column in metrics:
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for name, entry in stages:
+                lines.append(f'{prefix}_{metric}{{stage="{name}"{extra}}} {round(entry[column], 6)}')
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
@@ -0,0 +1,233 @@
+import os
+import json
+import queue
+import shutil
+import subprocess
+import threading
+from functools import lru_cache
+from concurrent.futures import CancelledError
+from fractions import Fraction
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+
+class MediaDemuxer:
+    """Decode a recording once with ffmpeg and serve its video frames and audio PCM.
+
+    One ffmpeg process writes raw BGR frames to stdout and mono float32 PCM
+    at sample_rate to a second pipe. Both streams run on the container's
+    media clock: video is forced to constant frame rate, so frame i is at
+    i * 1000 / fps ms, and gaps in the audio are filled, so sample n is at
+    n * 1000 / sample_rate ms.
+
+    ffmpeg writes the two streams interleaved in media time, so frames() and
+    audio_chunks() must be consumed concurrently (e.g. video on one thread and
+    audio on another). The audio side buffers at most max_buffered_seconds
+    ahead of its consumer. If either consumer stops early, ffmpeg is killed
+    and the other side raises CancelledError instead of seeing a short stream.
+
+    The constructor waits for ffmpeg's first output, so an ffmpeg that
+    cannot decode the recording raises RuntimeError there, while the caller
+    can still fall back to other decoders, rather than from frames().
+    """
+    CHUNK_SAMPLES = 1 << 16
+
+    def __init__(self, path: str, sample_rate: int = 22050, max_buffered_seconds: float = 120.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.info = self.probe(path)
+        self.fps = self.info["fps"]
+        self.width = self.info["width"]
+        self.height = self.info["height"]
+        self.has_audio = self.info["has_audio"]
+        self.frames_read = 0
+        self.samples_read = 0
+        self._closed = threading.Event()
+        self._finished = {"video": False, "audio": not self.has_audio}
+        self._audio = queue.Queue(maxsize=max(1, int(max_buffered_seconds * sample_rate / self.CHUNK_SAMPLES)))
+        self._stderr = b""
+        self._video_started = False
+        self._start()
+        self._wait_started()
+
+    @staticmethod
+    def supported() -> bool:
+        # The audio pipe is passed to ffmpeg as an inherited fd, which needs POSIX
+        return os.name == "posix" and shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _cfr_option() -> str:
+        # -fps_mode replaced -vsync in ffmpeg 5.1; older builds only know -vsync
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-h", "full"], capture_output=True, text=True)
+        return "-fps_mode" if "\n-fps_mode" in result.stdout else "-vsync"
+
+    @staticmethod
+    def probe(path: str) -> Dict:
+        """Frame rate, size and stream layout from the container header."""
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries",
+             "stream=codec_type,width,height,avg_frame_rate,r_frame_rate,nb_frames", "-of", "json", path],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffprobe failed on {path}: {result.stderr.strip()}")
+        streams = json.loads(result.stdout).get("streams", [])
+        video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+        if video is None:
+            raise ValueError(f"No video stream in {path}")
+        rate = video.get("avg_frame_rate") or "0/0"
+        if rate in ("0/0", "0/1"):
+            rate = video.get("r_frame_rate") or "0/0"
+        numerator, denominator = rate.split("/")
+        fps = float(Fraction(int(numerator), int(denominator))) if int(denominator) else 0.0
+        if fps <= 0:
+            raise ValueError(f"Unknown frame rate in {path}")
+        return {
+            "fps": fps,
+            "width": int(video["width"]),
+            "height": int(video["height"]),
+            "frame_count": int(video.get("nb_frames") or 0),
+            "has_audio": any(stream.get("codec_type") == "audio" for stream in streams)
+        }
+
+    def _start(self):
+        command = ["ffmpeg", "-nostdin", "-v", "error", "-i", self.path,
+                   "-map", "0:v:0", self._cfr_option(), "cfr", "-r", repr(self.fps),
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        self._audio_pipe = None
+        self._threads = [threading.Thread(target=self._read_stderr, name="demux-stderr", daemon=True)]
+        if not self.has_audio:
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        else:
+            audio_read, audio_write = os.pipe()
+            command += ["-map", "0:a:0", "-af", "aresample=async=1", "-ac", "1", "-ar", str(self.sample_rate),
+                        "-f", "f32le", f"pipe:{audio_write}"]
+            try:
+                self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                                pass_fds=(audio_write,))
+            except BaseException:
+                os.close(audio_read)
+                raise
+            finally:
+                os.close(audio_write)
+            self._audio_pipe = os.fdopen(audio_read, "rb")
+            self._threads.append(threading.Thread(target=self._read_audio, name="demux-audio", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _wait_started(self):
+        try:
+            # peek leaves the bytes for frames(); it returns nothing only at EOF
+            if not self.process.stdout.peek(1):
+                # Raises if ffmpeg failed, e.g. on an option it does not know
+                self._check_exit()
+        except BaseException:
+            self.close()
+            raise
+
+    # Each pipe is closed by the thread that reads it, so close() can run on
+    # another thread while a consumer is still blocked in a read
+    def _read_stderr(self):
+        with self.process.stderr:
+            self._stderr = self.process.stderr.read()
+
+    def _read_audio(self):
+        try:
+            while not self._closed.is_set():
+                data = self._audio_pipe.read(self.CHUNK_SAMPLES * 4)
+                if not data:
+                    break
+                if not self._put(np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)):
+                    return
+        finally:
+            self._put(None)
+            self._audio_pipe.close()
+
+    def _put(self, item) -> bool:
+        while not self._closed.is_set():
+            try:
+                self._audio.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _check_exit(self):
+        self._threads[0].join()
+        if self._closed.is_set():
+            raise CancelledError("Media ingestion closed")
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {self.path}: "
+                               f"{self._stderr.decode(errors='replace').strip()}")
+
+    def frames(self, buffers: int = 2) -> Iterator[Tuple[int, int, np.ndarray]]:
+        """Yield (frame_index, pts_ms, frame) for every frame, as _sampled_frames does.
+
+        Frames are read into a ring of ``buffers`` reused arrays, so a yielded
+        frame stays valid only until ``buffers`` more frames have been read.
+        """
+        frame_bytes = self.width * self.height * 3
+        ring = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(buffers)]
+        self._video_started = True
+        try:
+            while not self._closed.is_set():
+                frame = ring[self.frames_read % buffers]
+                if self.process.stdout.readinto(memoryview(frame).cast("B")) != frame_bytes:
+                    break
+                yield self.frames_read, int(round(self.frames_read * 1000 / self.fps)), frame
+                self.frames_read += 1
+            self._check_exit()
+            self._finished["video"] = True
+        finally:
+            self.process.stdout.close()
+            if not self._finished["video"]:
+                self.close()
+
+    def audio_chunks(self) -> Iterator[np.ndarray]:
+        """Yield mono float32 chunks at sample_rate; nothing if the recording has no audio."""
+        if not self.has_audio:
+            return
+        try:
+            while True:
+                try:
+                    chunk = self._audio.get(timeout=0.1)
+                except queue.Empty:
+                    if self._closed.is_set():
+                        break
+                    continue
+                if chunk is None:
+                    break
+                self.samples_read += len(chunk)
+                yield chunk
+            # A failed decode also ends the pipe, so wait for ffmpeg's exit status
+            # rather than reporting a truncated track as complete
+            self._check_exit()
+            self._finished["audio"] = True
+        finally:
+            if not self._finished["audio"]:
+                self.close()
+
+    @property
+    def audio_clock_ms(self) -> int:
+        return int(round(self.samples_read * 1000 / self.sample_rate))
+
+    def close(self):
+        """Stop ffmpeg; safe to call more than once and from either consumer's thread."""
+        if not (self._finished["video"] and self._finished["audio"]):
+            self._closed.set()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        if not self._video_started:
+            self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
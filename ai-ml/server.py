@@ -0,0 +1,218 @@
+"""Resident analysis service that keeps ExamMonitor workers warm between jobs.
+
+Endpoints (JSON over HTTP, bound to localhost by default):
+
+    POST /jobs        {"video", "audio", "student_id", "output"} -> 202 {"job_id", "status"}
+    GET  /jobs/<id>   job status: queued, running, succeeded or failed, plus the report once done
+    GET  /health      worker count, queued/running job counts and draining flag
+
+SIGTERM or SIGINT starts a graceful drain: new jobs are rejected with 503,
+accepted jobs run to completion, then the server exits.
+"""
+import sys
+import json
+import uuid
+import signal
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from batch import init_worker, run_session
+
+REQUIRED_FIELDS = ("video", "audio", "student_id", "output")
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class AnalysisService:
+    def __init__(self, workers: int = 2, max_pending: int = 64, max_retained: int = 1000,
+                 monitor_options: Optional[Dict] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        # Spawn, not fork: MediaPipe graphs and OpenCV thread pools are not fork-safe
+        context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                            initializer=init_worker,
+                                            initargs=(monitor_options or {},))
+        # Workers are started lazily; push a no-op through each so models load at startup
+        for _ in range(workers):
+            self.executor.submit(int)
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.draining = False
+
+    def _pending(self) -> int:
+        return sum(1 for job in self.jobs.values() if job["status"] in ("queued", "running"))
+
+    def submit(self, row: Dict) -> Dict:
+        if not isinstance(row, dict):
+            raise ValueError("Request body must be a JSON object")
+        missing = [key for key in REQUIRED_FIELDS if key not in row]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+        with self.lock:
+            if self.draining:
+                raise ServiceUnavailable("Service is draining")
+            if self._pending() >= self.max_pending:
+                raise ServiceUnavailable("Too many pending jobs")
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "student_id": row["student_id"],
+                "status": "queued",
+                "submitted_at": datetime.now().isoformat(),
+                "finished_at": None
+            }
+            try:
+                job["future"] = self.executor.submit(run_session, {key: row[key] for key in REQUIRED_FIELDS})
+            except BrokenProcessPool as e:
+                # A worker died abruptly (e.g. killed for memory); the pool takes no new jobs
+                raise ServiceUnavailable(f"Worker pool is broken: {e}") from e
+            self.jobs[job_id] = job
+            self._evict_finished()
+
+        job["future"].add_done_callback(lambda future: self._finish(job_id, future))
+        logging.info(f"Accepted job {job_id} for student {row['student_id']}")
+        return self._public(job)
+
+    def _finish(self, job_id: str, future):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["finished_at"] = datetime.now().isoformat()
+            try:
+                result = future.result()
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+            else:
+                job["status"] = "succeeded" if result["ok"] else "failed"
+                job["seconds"] = round(result["seconds"], 3)
+                job["report"] = result["report"]
+                if not result["ok"]:
+                    job["error"] = "Analysis failed. Check service logs for details."
+        logging.info(f"Job {job_id} {job['status']}")
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("succeeded", "failed")]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_retained)]:
+            del self.jobs[job_id]
+
+    def _public(self, job: Dict) -> Dict:
+        public = {key: value for key, value in job.items() if key != "future"}
+        if job["status"] == "queued" and job["future"].running():
+            public["status"] = "running"
+        return public
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def health(self) -> Dict:
+        with self.lock:
+            statuses = [self._public(job)["status"] for job in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "draining": self.draining
+        }
+
+    def drain(self):
+        """Stop accepting jobs and wait for accepted ones to finish."""
+        with self.lock:
+            self.draining = True
+        logging.info("Draining: waiting for accepted jobs to finish")
+        self.executor.shutdown(wait=True)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status: int, body: Dict):
+        payload = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            row = json.loads(self.rfile.read(length) or b"{}")
+            job = self.server.service.submit(row)
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": str(e)})
+        except ServiceUnavailable as e:
+            self._send_json(503, {"error": str(e)})
+        else:
+            self._send_json(202, job)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, self.server.service.health())
+        elif path.startswith("/jobs/"):
+            job = self.server.service.get(path[len("/jobs/"):])
+            if job:
+                self._send_json(200, job)
+            else:
+                self._send_json(404, {"error": "Unknown job"})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = 2, max_pending: int = 64,
+          monitor_options: Optional[Dict] = None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    service = AnalysisService(workers, max_pending, monitor_options=monitor_options)
+    httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+    httpd.service = service
+
+    def shutdown():
+        service.drain()
+        httpd.shutdown()
+
+    def handle_signal(signum, frame):
+        if not service.draining:
+            # serve_forever runs on this thread, so shut down from another one
+            threading.Thread(target=shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    logging.info(f"Analysis service listening on http://{host}:{port} with {workers} workers")
+    httpd.serve_forever()
+    httpd.server_close()
+    logging.info("Analysis service stopped")
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    serve(port=port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The models are imported as top-level packages from ai-ml/, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+import pytest
+
+from models.activity_model.activity_detector import EnhancedActivityAnalyzer
+
+
+def _quiet_clip(path: str, frames: int = 90):
+    # A face drifting slowly with sensor noise: it moves, but never suddenly
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (320, 240))
+    for i in range(frames):
+        frame = np.full((240, 320, 3), 40, np.uint8)
+        cx = 160 + int(40 * np.sin(i / 10))
+        cv2.ellipse(frame, (cx, 120), (50, 70), 0, 0, 360, (180, 200, 230), -1)
+        cv2.circle(frame, (cx - 20, 100), 6, (0, 0, 0), -1)
+        cv2.circle(frame, (cx + 20, 100), 6, (0, 0, 0), -1)
+        cv2.ellipse(frame, (cx, 150), (20, 5), 0, 0, 360, (50, 50, 150), -1)
+        frame = np.clip(frame + rng.normal(0, 2, frame.shape), 0, 255).astype(np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+@pytest.mark.parametrize("metrics_chunk", [1, 8])
+def test_quiet_clip_is_subsampled(tmp_path, metrics_chunk):
+    path = str(tmp_path / "quiet.mp4")
+    _quiet_clip(path)
+
+    report = EnhancedActivityAnalyzer(target_fps=5, metrics_chunk=metrics_chunk).process_video(path)
+
+    sampling = report["sampling"]
+    assert sampling["sampling_step"] == 6
+    assert report["activity_metrics"]["face_activity_percentage"] > 90
+    # Every sixth frame, and no bursts of full-rate sampling
+    assert sampling["frames_analyzed"] == 90 // 6
+
+
+def test_spike_threshold_is_per_source_frame():
+    analyzer = EnhancedActivityAnalyzer(target_fps=5, spike_threshold=0.5)
+
+    # At full rate the test is the one _compare_metrics applies
+    assert analyzer._is_spike(0.0, 0.6, 1)
+    assert analyzer._is_spike(0.2, 0.0, 1)
+    # The same change spread over six frames is not a spike
+    assert not analyzer._is_spike(0.0, 0.6, 6)
+    assert not analyzer._is_spike(0.2, 0.0, 6)
+    # A change that is fast per frame still is
+    assert analyzer._is_spike(0.0, 4.0, 6)
+    np.testing.assert_array_equal(analyzer._is_spike(np.array([0.0, 0.7]), np.array([0.6, 0.0]), np.array([1, 6])),
+                                  [True, True])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from models.audio_model.audio_processor import SoundFeatureExtractor, SpectralContext
+
+
+def _tone(samples: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(samples) / SpectralContext.ANALYSIS_SR
+    return (0.3 * np.sin(2 * np.pi * 220 * t) + 0.01 * rng.standard_normal(samples)).astype(np.float32)
+
+
+@pytest.mark.parametrize("samples", [SpectralContext.N_FFT // 2, SpectralContext.ANALYSIS_SR * 3])
+def test_streaming_matches_in_memory_within_one_block(tmp_path, samples):
+    # Shorter than one STFT window, and shorter than one streaming block
+    path = str(tmp_path / "clip.wav")
+    sf.write(path, _tone(samples), SpectralContext.ANALYSIS_SR)
+
+    in_memory = SoundFeatureExtractor().extract_voice_features(path)
+    streamed = SoundFeatureExtractor(streaming=True).extract_voice_features(path)
+
+    assert streamed is not None
+    for name, value in in_memory["voice_metrics"].items():
+        assert streamed["voice_metrics"][name] == pytest.approx(value, rel=1e-5)
+
+
+def test_streaming_tail_shorter_than_window_gets_frames():
+    extractor = SoundFeatureExtractor(streaming=True, block_frames=8)
+    blocksize = (extractor.block_frames - 1) * SpectralContext.HOP_LENGTH + SpectralContext.N_FFT
+    overlap = SpectralContext.N_FFT - SpectralContext.HOP_LENGTH
+    audio = _tone(blocksize + SpectralContext.HOP_LENGTH // 2)
+    # What is left after the first block is less than one window
+    assert len(audio) - (blocksize - overlap) < SpectralContext.N_FFT
+
+    frames = []
+    block_magnitude = extractor._block_magnitude
+
+    def counting_magnitude(block, center=False):
+        magnitude = block_magnitude(block, center)
+        frames.append(magnitude.shape[1])
+        return magnitude
+
+    extractor._block_magnitude = counting_magnitude
+    features = extractor._extract_voice_features_streaming(iter([audio]))
+
+    assert features["voice_metrics"]["strength"] > 0
+    # A centred STFT's frames, less the two before the first full window
+    assert sum(frames) == 1 + len(audio) // SpectralContext.HOP_LENGTH - 2
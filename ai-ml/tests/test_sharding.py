@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+
+from models.activity_model.activity_detector import SHARD_TOLERANCE, EnhancedActivityAnalyzer
+
+
+def _clip(path: str, frames: int = 240):
+    # A face sitting still with sensor noise, moving and talking one second in four
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (320, 240))
+    cx = 160
+    for i in range(frames):
+        moving = (i // 30) % 4 == 3
+        if moving:
+            cx = 160 + int(40 * np.sin(i / 3))
+        frame = np.full((240, 320, 3), 40, np.uint8)
+        cv2.ellipse(frame, (cx, 120), (50, 70), 0, 0, 360, (180, 200, 230), -1)
+        eye_height = 1 if i % 60 < 3 else 6
+        cv2.ellipse(frame, (cx - 20, 100), (7, eye_height), 0, 0, 360, (0, 0, 0), -1)
+        cv2.ellipse(frame, (cx + 20, 100), (7, eye_height), 0, 0, 360, (0, 0, 0), -1)
+        cv2.ellipse(frame, (cx, 150), (20, 5 + (i % 15 if moving else 0)), 0, 0, 360, (50, 50, 150), -1)
+        frame = np.clip(frame + rng.normal(0, 2, frame.shape), 0, 255).astype(np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+@pytest.mark.parametrize("target_fps", [None, 5])
+def test_sharded_metrics_within_tolerance(tmp_path, target_fps):
+    path = str(tmp_path / "session.mp4")
+    _clip(path)
+
+    sequential = EnhancedActivityAnalyzer(target_fps=target_fps).process_video(path)
+    sharded = EnhancedActivityAnalyzer(target_fps=target_fps).process_video_sharded(path, num_shards=3)
+
+    assert sharded["sharding"]["shards"] == 3
+    assert sharded["sharding"]["tolerance_percentage_points"] == SHARD_TOLERANCE
+    if target_fps is None:
+        assert sharded["sampling"]["frames_analyzed"] == sequential["sampling"]["frames_analyzed"]
+    for name, value in sequential["activity_metrics"].items():
+        assert sharded["activity_metrics"][name] == pytest.approx(value, abs=SHARD_TOLERANCE), name